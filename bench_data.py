@@ -0,0 +1,145 @@
+"""
+Deterministic synthetic data for the Budget-er benchmarks.
+
+The same (size, seed) always produces the same expenses: a few frequent
+categories (Food, Gas) and a long tail, amounts drawn per category,
+timestamps spread over the years before a fixed end date. Usage:
+
+    python bench_data.py db 100k bench_data/100k.db
+    python bench_data.py csv 1m bench_data/1m.csv
+"""
+import argparse
+import csv
+import math
+import os
+import random
+from datetime import datetime, timedelta
+
+import budget_db
+from budget_units import format_amount, format_timestamp, to_timestamp
+
+END_DATE = datetime(2025, 12, 31, 23, 59, 59)
+DAYS_PER_100K = 365          # history length scales with size, capped below
+MAX_DAYS = 20 * 365
+
+# (name, relative frequency, median amount). Frequencies follow a rough
+# Zipf curve, so the top two categories hold about half the rows.
+CATEGORIES = [
+    ("Food", 40, 18.0),
+    ("Gas", 20, 45.0),
+    ("Personal", 13, 30.0),
+    ("Utilities", 10, 90.0),
+    ("Coffee", 8, 5.0),
+    ("Entertainment", 6, 25.0),
+    ("Subscriptions", 5, 12.0),
+    ("Health", 4, 60.0),
+    ("Travel", 2, 400.0),
+    ("Gifts", 2, 50.0),
+    ("Rent", 1, 1500.0),
+    ("Insurance", 1, 180.0),
+]
+
+# Descriptions drawn per category, so search has realistic text to index.
+MERCHANTS = {
+    "Food": ["Whole Foods Market", "Trader Joe's", "Safeway", "Costco Wholesale",
+             "Chipotle Mexican Grill", "Local Farmers Market", "Pizza Palace"],
+    "Gas": ["Shell", "Chevron", "Exxon Mobil", "Costco Gas", "BP Station"],
+    "Personal": ["Amazon Marketplace", "Target", "CVS Pharmacy", "Barber Shop"],
+    "Utilities": ["City Water Dept", "Pacific Gas and Electric", "Comcast Internet"],
+    "Coffee": ["Starbucks", "Blue Bottle Coffee", "Peet's Coffee", "Corner Cafe"],
+    "Entertainment": ["AMC Theatres", "Steam Games", "Concert Tickets", "Bowling Alley"],
+    "Subscriptions": ["Netflix", "Spotify Premium", "Amazon Prime", "Cloud Storage"],
+    "Health": ["Walgreens Pharmacy", "Dental Clinic", "Gym Membership"],
+    "Travel": ["Delta Air Lines", "Marriott Hotels", "Airbnb Stay", "Uber Ride"],
+    "Gifts": ["Etsy Shop", "Amazon Gift", "Flower Delivery"],
+    "Rent": ["Monthly Rent"],
+    "Insurance": ["State Farm Auto", "Renters Insurance"],
+}
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+CHUNK = 50_000
+
+
+def parse_size(text):
+    text = text.lower()
+    if text in SIZES:
+        return SIZES[text]
+    return int(text.replace("_", ""))
+
+
+def iter_rows(count, seed=0):
+    """Yield (cents, category name, timestamp, description) in date order."""
+    rng = random.Random(seed)
+    names = [c[0] for c in CATEGORIES]
+    weights = [c[1] for c in CATEGORIES]
+    medians = {c[0]: c[2] for c in CATEGORIES}
+
+    days = min(MAX_DAYS, max(30, count * DAYS_PER_100K // 100_000))
+    span = days * 86400
+    start = to_timestamp(END_DATE - timedelta(days=days))
+    step = span / count
+
+    for i in range(count):
+        name = rng.choices(names, weights)[0]
+        cents = round(medians[name] * 100 * math.exp(rng.gauss(0, 0.6)))
+        offset = int(i * step + rng.random() * step)
+        yield cents, name, start + offset, rng.choice(MERCHANTS[name])
+
+
+def generate_db(path, count, seed=0):
+    """Create a budget.db-compatible file at path holding count expenses."""
+    for stale in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    previous = budget_db.DB_NAME
+    budget_db.DB_NAME = path
+    try:
+        budget_db.create_tables()
+        with budget_db.transaction() as cur:
+            for name, _, _ in CATEGORIES:
+                cur.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (name,))
+            ids = dict((name, cat_id) for cat_id, name in cur.execute("SELECT id, name FROM categories"))
+
+            insert = """
+                INSERT INTO expenses (amount_cents, category_id, ts, description)
+                VALUES (?, ?, ?, ?)
+            """
+            batch = []
+            for cents, name, ts, description in iter_rows(count, seed):
+                batch.append((cents, ids[name], ts, description))
+                if len(batch) >= CHUNK:
+                    cur.executemany(insert, batch)
+                    batch.clear()
+            if batch:
+                cur.executemany(insert, batch)
+
+        budget_db.connect().execute("PRAGMA optimize")
+    finally:
+        budget_db.close_connections()
+        budget_db.DB_NAME = previous
+
+
+def generate_csv(path, count, seed=0):
+    """Write count expenses as an import-ready CSV."""
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["ID", "Amount", "Category", "Date", "Description"])
+        for i, (cents, name, ts, description) in enumerate(iter_rows(count, seed), 1):
+            writer.writerow([i, format_amount(cents), name, format_timestamp(ts), description])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Budget-er data.")
+    parser.add_argument("kind", choices=["db", "csv"])
+    parser.add_argument("size", help="10k, 100k, 1m, 10m or a row count")
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    generate = generate_db if args.kind == "db" else generate_csv
+    generate(args.path, parse_size(args.size), args.seed)
+
+
+if __name__ == "__main__":
+    main()
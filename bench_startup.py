@@ -0,0 +1,100 @@
+"""
+Startup benchmark for Budget-er.
+
+Each run starts a fresh interpreter in a scratch directory (so it gets
+its own budget.db) and reports:
+
+  import_ms       time to import budget_app
+  first_paint_ms  time to build the dashboard and process the first
+                  round of Tk events (None when there is no display)
+  matplotlib      whether matplotlib was imported by then
+
+The first run creates the database; later runs show the warm path where
+the schema check is skipped. Usage:
+
+    python bench_startup.py [--runs N] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = r"""
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+
+t0 = time.perf_counter()
+import budget_app
+t1 = time.perf_counter()
+
+result = {"import_ms": (t1 - t0) * 1000, "first_paint_ms": None}
+try:
+    root = budget_app.build_main_ui()
+    root.update()
+    result["first_paint_ms"] = (time.perf_counter() - t1) * 1000
+    root.destroy()
+except budget_app.tk.TclError:
+    pass  # no display
+
+result["matplotlib"] = "matplotlib" in sys.modules
+print(json.dumps(result))
+"""
+
+
+def run_once(workdir):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE, HERE],
+        cwd=workdir, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs, key):
+    values = [r[key] for r in runs if r[key] is not None]
+    if not values:
+        return None
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cold = run_once(workdir)
+        warm = [run_once(workdir) for _ in range(args.runs)]
+
+    report = {
+        "cold": cold,
+        "warm": {
+            "import_ms": summarize(warm, "import_ms"),
+            "first_paint_ms": summarize(warm, "first_paint_ms"),
+            "matplotlib": any(r["matplotlib"] for r in warm),
+        },
+        "runs": args.runs,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    def fmt(ms):
+        return "n/a (no display)" if ms is None else f"{ms:8.1f} ms"
+
+    print(f"cold import:       {fmt(cold['import_ms'])}")
+    print(f"cold first paint:  {fmt(cold['first_paint_ms'])}")
+    w = report["warm"]
+    print(f"warm import:       {fmt(w['import_ms'] and w['import_ms']['median'])}  (median of {args.runs})")
+    print(f"warm first paint:  {fmt(w['first_paint_ms'] and w['first_paint_ms']['median'])}")
+    print(f"matplotlib loaded at startup: {w['matplotlib']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Benchmark suite for the Budget-er data paths. Runs headless (no Tk).
+
+For each dataset size it generates (or reuses) a synthetic database and
+CSV from bench_data.py, then times the hot operations and records the
+peak Python memory each one allocates:
+
+  get_expenses          full joined, date-sorted listing
+  calculate_summary     dashboard summary
+  expense_manager_load  first table page + total, then 20 pages of scrolling
+  category_totals       Charts window data
+  trend_data            NumPy analytics behind the trend charts (cold cache)
+  export_expenses_csv   streaming export to a temp file
+  import_expenses_csv   import of the matching CSV into an empty database
+
+Timings are the best and median of --repeat runs; peak memory comes
+from one extra run under tracemalloc. Usage:
+
+    python bench_suite.py --sizes 10k,100k --json bench_output.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import bench_data
+import budget_analytics
+import budget_db
+import budget_logic
+
+
+# -----------------------------
+# OPERATIONS
+# -----------------------------
+def op_get_expenses(ctx):
+    return len(budget_db.get_expenses())
+
+
+def op_calculate_summary(ctx):
+    return budget_logic.calculate_summary()
+
+
+def op_expense_manager_load(ctx):
+    rows = budget_db.get_expense_page()
+    budget_db.get_expense_total()
+    for _ in range(20):
+        if not rows:
+            break
+        rows = budget_db.get_expense_page(after=budget_db.expense_sort_key(rows[-1]))
+
+
+def op_category_totals(ctx):
+    return budget_db.get_category_totals()
+
+
+def op_trend_data(ctx):
+    budget_analytics.clear_cache()
+    return budget_analytics.trend_data()
+
+
+def op_export(ctx):
+    path = os.path.join(ctx["tmp"], "export.csv")
+    budget_db.export_expenses_csv(path)
+    os.remove(path)
+
+
+def op_import(ctx):
+    # Fresh empty database each run so repeats measure the same work.
+    path = os.path.join(ctx["tmp"], f"import-{time.monotonic_ns()}.db")
+    budget_db.DB_NAME = path
+    try:
+        budget_db.create_tables()
+        budget_db.import_expenses_csv(ctx["csv"])
+    finally:
+        budget_db.close_connections()
+        budget_db.DB_NAME = ctx["db"]
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+OPERATIONS = {
+    "get_expenses": op_get_expenses,
+    "calculate_summary": op_calculate_summary,
+    "expense_manager_load": op_expense_manager_load,
+    "category_totals": op_category_totals,
+    "trend_data": op_trend_data,
+    "export_expenses_csv": op_export,
+    "import_expenses_csv": op_import,
+}
+
+
+# -----------------------------
+# HARNESS
+# -----------------------------
+def ensure_data(data_dir, size_name, count, seed):
+    os.makedirs(data_dir, exist_ok=True)
+    db_path = os.path.join(data_dir, f"{size_name}-seed{seed}.db")
+    csv_path = os.path.join(data_dir, f"{size_name}-seed{seed}.csv")
+
+    # Regenerate when the schema has moved on since the file was built.
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        conn.close()
+        if version != budget_db.SCHEMA_VERSION:
+            os.remove(db_path)
+
+    if not os.path.exists(db_path):
+        print(f"generating {db_path} ...", file=sys.stderr)
+        bench_data.generate_db(db_path, count, seed)
+    if not os.path.exists(csv_path):
+        print(f"generating {csv_path} ...", file=sys.stderr)
+        bench_data.generate_csv(csv_path, count, seed)
+    return db_path, csv_path
+
+
+def measure(fn, ctx, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(ctx)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "best_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_bytes": peak,
+    }
+
+
+def run(sizes, ops, repeat, data_dir, seed):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_name in sizes:
+            count = bench_data.parse_size(size_name)
+            db_path, csv_path = ensure_data(data_dir, size_name, count, seed)
+            ctx = {"db": db_path, "csv": csv_path, "tmp": tmp}
+
+            budget_db.DB_NAME = db_path
+            budget_db.create_tables()
+            try:
+                for name in ops:
+                    stats = measure(OPERATIONS[name], ctx, repeat)
+                    results.append({"size": count, "op": name, **stats})
+                    print(f"{size_name:>6} {name:<22} {stats['median_s'] * 1000:10.2f} ms"
+                          f" {stats['peak_bytes'] / 1e6:9.2f} MB peak", file=sys.stderr)
+            finally:
+                budget_db.close_connections()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "schema_version": budget_db.SCHEMA_VERSION,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Budget-er data paths.")
+    parser.add_argument("--sizes", default="10k,100k",
+                        help="comma-separated: 10k, 100k, 1m, 10m or row counts")
+    parser.add_argument("--ops", default=",".join(OPERATIONS),
+                        help="comma-separated subset of: " + ", ".join(OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="bench_data")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    ops = [op.strip() for op in args.ops.split(",") if op.strip()]
+    unknown = set(ops) - set(OPERATIONS)
+    if unknown:
+        parser.error(f"unknown operation(s): {', '.join(sorted(unknown))}")
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    report = run(sizes, ops, args.repeat, args.data_dir, args.seed)
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from budget_db import category_registry, current_period, get_revision, iter_expense_columns
+from budget_logic import pending_occurrences, period_bounds, shift_period
+from budget_profile import profiled
+from budget_units import from_cents
+
+# -----------------------------
+# COLUMNAR EXPENSE DATA
+# -----------------------------
+# Trends and percentiles work on whole columns, so instead of looping
+# over row tuples the expenses are read once into three contiguous int64
+# arrays (cents, category id, timestamp) and every statistic is a
+# vectorized operation over them. The arrays are cached per date range and
+# reused until the data revision moves on.
+#
+# numpy is already a matplotlib dependency. This module is only imported
+# from worker threads (charts, reports), never at startup.
+Columns = namedtuple("Columns", "revision amounts categories timestamps")
+
+ROLLING_WINDOW = 3
+CACHE_SLOTS = 4
+SCHEDULED_MONTHS_AHEAD = 2
+
+_cache = {}  # (start, end) -> Columns
+_cache_lock = threading.Lock()
+
+
+def _empty(revision):
+    return Columns(revision, np.empty(0, np.int64), np.empty(0, np.int64),
+                   np.empty(0, np.int64))
+
+
+@profiled("analytics.load_columns")
+def load_columns(start=None, end=None):
+    """
+    Columns for the expenses with start <= timestamp < end (either may be
+    None), sorted by date. Cached until the revision changes.
+    """
+    revision = get_revision()
+    key = (start, end)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None and cached.revision == revision:
+        return cached
+
+    chunks = [np.array(rows, dtype=np.int64) for rows in iter_expense_columns(start, end)]
+    if not chunks:
+        columns = _empty(revision)
+    else:
+        # Transposed copy: each column becomes one contiguous array.
+        amounts, categories, timestamps = np.concatenate(chunks).T.copy()
+        columns = Columns(revision, amounts, categories, timestamps)
+
+    with _cache_lock:
+        if len(_cache) >= CACHE_SLOTS and key not in _cache:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = columns
+    return columns
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _months(timestamps):
+    """Months since 1970-01 for each epoch-seconds timestamp."""
+    return timestamps.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+
+def _period(month_index):
+    return f"{1970 + month_index // 12:04d}-{month_index % 12 + 1:02d}"
+
+
+# -----------------------------
+# STATISTICS
+# -----------------------------
+def monthly_totals(columns=None):
+    """(["YYYY-MM", ...], cents) for every month from the first expense to the last."""
+    columns = columns if columns is not None else load_columns()
+    if not len(columns.amounts):
+        return [], np.empty(0)
+
+    months = _months(columns.timestamps)
+    first = months.min()
+    totals = np.bincount(months - first, weights=columns.amounts).astype(np.int64)
+    return [_period(first + i) for i in range(len(totals))], totals
+
+
+def monthly_totals_from(first, months):
+    """Cents spent in each of months consecutive periods starting at "YYYY-MM" first."""
+    start = period_bounds(first)[0]
+    end = period_bounds(shift_period(first, months - 1))[1]
+    columns = load_columns(start, end)
+    if not len(columns.amounts):
+        return np.zeros(months, dtype=np.int64)
+    index = _months(columns.timestamps) - _months(np.array([start], dtype=np.int64))[0]
+    return np.bincount(index, weights=columns.amounts, minlength=months).astype(np.int64)
+
+
+def monthly_category_totals(columns=None):
+    """
+    (periods, category ids, matrix) where matrix[i, j] is the cents spent
+    in periods[i] on category ids[j].
+    """
+    columns = columns if columns is not None else load_columns()
+    if not len(columns.amounts):
+        return [], np.empty(0, np.int64), np.empty((0, 0))
+
+    months = _months(columns.timestamps)
+    first = months.min()
+    ids, codes = np.unique(columns.categories, return_inverse=True)
+    span = months.max() - first + 1
+    cells = (months - first) * len(ids) + codes
+    matrix = np.bincount(cells, weights=columns.amounts, minlength=span * len(ids))
+    matrix = matrix.astype(np.int64).reshape(span, len(ids))
+    return [_period(first + i) for i in range(span)], ids, matrix
+
+
+def rolling_average(values, window=ROLLING_WINDOW):
+    """Trailing mean over window points; the first points average what exists."""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return values
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts
+
+
+def category_percentiles(columns=None, q=(50, 90)):
+    """{category id: array of the q-th percentiles of single expenses, in cents}."""
+    columns = columns if columns is not None else load_columns()
+    if not len(columns.amounts):
+        return {}
+
+    # Sort by category, then amount, so each category is one sorted slice.
+    order = np.lexsort((columns.amounts, columns.categories))
+    cats = columns.categories[order]
+    amounts = columns.amounts[order]
+    ids, starts = np.unique(cats, return_index=True)
+    ends = np.append(starts[1:], len(cats))
+    return {
+        int(cat_id): np.percentile(amounts[lo:hi], q)
+        for cat_id, lo, hi in zip(ids, starts, ends)
+    }
+
+
+def scheduled_by_month(first, months):
+    """
+    Cents of pending recurring occurrences in each of months periods from
+    first, expanded for just that window.
+    """
+    start = period_bounds(first)[0]
+    end = period_bounds(shift_period(first, months - 1))[1]
+    totals = np.zeros(months, dtype=np.int64)
+    pending = pending_occurrences(start, end)
+    if pending:
+        stamps = np.array([o.ts for o in pending], dtype=np.int64)
+        index = _months(stamps) - _months(np.array([start], dtype=np.int64))[0]
+        totals = np.bincount(index, weights=[o.amount for o in pending],
+                             minlength=months).astype(np.int64)
+    return totals
+
+
+# -----------------------------
+# CHART DATA
+# -----------------------------
+@profiled("analytics.trend_data")
+def trend_data():
+    """
+    Everything the trend charts draw, as plain lists in currency units:
+    monthly totals with their rolling average, pending recurring expenses
+    from this month to SCHEDULED_MONTHS_AHEAD months on, and median /
+    90th percentile expense per category.
+    """
+    columns = load_columns()
+    periods, totals = monthly_totals(columns)
+    names = category_registry().names
+    percentiles = category_percentiles(columns)
+
+    # Extend the months to cover the scheduled window; the average only
+    # runs over months that have data.
+    rolling = rolling_average(totals)
+    this_month = current_period()
+    last = shift_period(this_month, SCHEDULED_MONTHS_AHEAD)
+    if not periods:
+        periods = [this_month]
+    while periods[-1] < last:
+        periods.append(shift_period(periods[-1], 1))
+    padding = len(periods) - len(totals)
+    totals = np.append(totals, np.zeros(padding, np.int64))
+    rolling = np.append(rolling, np.full(padding, np.nan))
+
+    scheduled = np.zeros(len(periods), dtype=np.int64)
+    if this_month >= periods[0]:
+        offset = periods.index(this_month)
+        scheduled[offset:] = scheduled_by_month(this_month, len(periods) - offset)
+
+    ranked = sorted(percentiles.items(), key=lambda kv: kv[1][1], reverse=True)
+    return {
+        "periods": periods,
+        "totals": from_cents(totals).tolist(),
+        "scheduled": from_cents(scheduled).tolist(),
+        "rolling": from_cents(rolling).tolist(),
+        "categories": [names.get(cat_id, "Uncategorized") for cat_id, _ in ranked],
+        "p50": [from_cents(float(p[0])) for _, p in ranked],
+        "p90": [from_cents(float(p[1])) for _, p in ranked],
+    }
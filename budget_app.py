@@ -1,132 +1,440 @@
+import logging
+import math
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from datetime import datetime, timedelta
+from tkinter import ttk, messagebox, filedialog, simpledialog
 
 from budget_db import (
-    create_tables,
+    create_tables, close_connections,
     get_budget, update_budget,
-    get_categories, add_category, delete_category,
-    add_expense, get_expenses, delete_expense,
-    export_expenses_csv, import_expenses_csv
+    get_categories, add_category, delete_category, category_id,
+    add_expense, delete_expense, get_revision, current_revision,
+    get_expense_page, expense_sort_key, get_expense_total, get_category_totals,
+    sum_expenses, fts_query, skip_recurring, end_recurring,
+    EXPENSE_PAGE_SIZE,
+    export_expenses_csv, import_expenses_csv, import_expense_files,
+    snapshot_database, restore_snapshot, archive_years
 )
 
-from budget_logic import calculate_summary
+import budget_profile
+from budget_charts import (
+    draw_category_pie, draw_category_bars, draw_monthly_trend, draw_percentiles
+)
+from budget_logic import (
+    calculate_summary, current_period, shift_period, period_bounds,
+    pending_occurrences, confirm_occurrence, add_recurring_expense,
+)
+from budget_profile import profiled
+from budget_refresh import RefreshScheduler, tracked
+from budget_theme import init_theme, toggle_theme
+from budget_units import (
+    to_cents, from_cents, format_amount, format_money, to_timestamp, format_timestamp
+)
+from budget_worker import DBWorker
 
-# Ensure tables exist
-create_tables()
+# Set by build_main_ui(). Every budget_db call from a Tk callback goes
+# through it so the mainloop never waits on SQLite. Writes call
+# refresher.notify() instead of refreshing views themselves.
+worker = None
+refresher = None
 
-# -----------------------------
-# THEME SETTINGS
-# -----------------------------
-LIGHT_THEME = {
-    "bg": "#ffffff",
-    "fg": "#000000",
-    "entry_bg": "#f0f0f0",
-    "button_bg": "#e0e0e0",
-}
+# "YYYY-MM" month the dashboard shows; Save and the summary act on it.
+selected_period = current_period()
 
-DARK_THEME = {
-    "bg": "#1e1e1e",
-    "fg": "#ffffff",
-    "entry_bg": "#2e2e2e",
-    "button_bg": "#3e3e3e",
-}
-
-current_theme = LIGHT_THEME
-
-
-# ---------------------------------------------------
-# GLOBAL THEME APPLY FUNCTIONS
-# ---------------------------------------------------
-def apply_theme(root):
-    """Apply theme to root window and all children."""
-    root.configure(bg=current_theme["bg"])
-    for widget in root.winfo_children():
-        _apply_widget_theme(widget)
-
-
-def apply_theme_to_window(win):
-    """Apply theme to a Toplevel window and all nested children."""
-    win.configure(bg=current_theme["bg"])
-    for widget in win.winfo_children():
-        _apply_widget_theme(widget)
-        if isinstance(widget, (tk.Frame, tk.LabelFrame)):
-            for child in widget.winfo_children():
-                _apply_widget_theme(child)
-
-
-def _apply_widget_theme(widget):
-    cls = widget.winfo_class()
-    if cls in ("Frame", "LabelFrame"):
-        widget.configure(bg=current_theme["bg"])
-    elif cls == "Label":
-        widget.configure(bg=current_theme["bg"], fg=current_theme["fg"])
-    elif cls == "Entry":
-        widget.configure(
-            bg=current_theme["entry_bg"],
-            fg=current_theme["fg"]
-        )
-    elif cls == "Button":
-        widget.configure(
-            bg=current_theme["button_bg"],
-            fg=current_theme["fg"]
-        )
+# matplotlib is only needed by the Charts window and costs more to import
+# than the rest of the app combined, so it is loaded on first use (or by
+# a background prewarm once the main window is up).
+PREWARM_DELAY_MS = 1500
+_matplotlib = None
+_matplotlib_lock = threading.Lock()
 
 
-def toggle_theme(root):
-    global current_theme
-    current_theme = DARK_THEME if current_theme == LIGHT_THEME else LIGHT_THEME
-    apply_theme(root)
+def _load_matplotlib():
+    """Import and cache (Figure, FigureCanvasTkAgg)."""
+    global _matplotlib
+    with _matplotlib_lock:
+        if _matplotlib is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+            _matplotlib = (Figure, FigureCanvasTkAgg)
+    return _matplotlib
 
-    # Update theme for open windows
-    for window in root.winfo_children():
-        if isinstance(window, tk.Toplevel):
-            apply_theme_to_window(window)
 
+def prewarm_matplotlib():
+    """Import matplotlib on a daemon thread so the first Charts open is fast."""
+    threading.Thread(target=_load_matplotlib, name="matplotlib-prewarm", daemon=True).start()
 
 # -----------------------------
 # SUMMARY + SAVE LOGIC
 # -----------------------------
 def save_data(income_entry, expenses_entry, savings_entry, cash_entry, summary_labels):
     try:
-        income = float(income_entry.get())
-        savings = float(savings_entry.get())
-        cash = float(cash_entry.get())
-
-        update_budget(income, savings, cash)
-        update_summary(summary_labels)
-
+        income = to_cents(income_entry.get())
+        savings = to_cents(savings_entry.get())
+        cash = to_cents(cash_entry.get())
     except ValueError:
         summary_labels["remaining"].config(text="Enter valid numbers!")
+        return
 
+    worker.write(update_budget, income, savings, cash, selected_period,
+                 on_done=lambda _: refresher.notify())
 
-def update_summary(summary_labels):
-    data = calculate_summary()
 
-    summary_labels["remaining"].config(text=f"${data['remaining']:.2f}")
+@profiled("ui.update_summary")
+def update_summary(summary_labels):
+    worker.read(calculate_summary, selected_period, key="summary",
+                on_done=lambda data: _show_summary(summary_labels, data))
+
+
+@profiled("ui.show_summary")
+def _show_summary(summary_labels, data):
+    if data["period"] != selected_period:
+        return  # the user has moved to another month since
+    summary_labels["spent"].config(text=format_money(data["spent"]))
+    summary_labels["scheduled"].config(text=format_money(data["scheduled"]))
+    summary_labels["projected"].config(text=format_money(data["projected"]))
+    summary_labels["remaining"].config(text=format_money(data["remaining"]))
     summary_labels["savings_percent"].config(text=f"{data['savings_percent']:.1f}%")
-    summary_labels["weekly_allowance"].config(text=f"${data['weekly_allowance']:.2f}")
-
-    summary_labels["overspending"].config(
-        text="Overspending!" if data["overspending"] else ""
-    )
+    summary_labels["weekly_allowance"].config(text=format_money(data["weekly_allowance"]))
+
+    if data["overspending"]:
+        warning = "Overspending!"
+    elif data["projected_overspending"]:
+        warning = "On track to overspend this month"
+    else:
+        warning = ""
+    summary_labels["overspending"].config(text=warning)
     summary_labels["negative_cash"].config(
         text="Negative Cash Balance!" if data["negative_cash"] else ""
     )
 
 
+# -----------------------------
+# PAGED EXPENSE TABLE
+# -----------------------------
+class PagedExpenseTable:
+    """
+    Treeview over the expenses table that only ever holds a sliding window
+    of rows. Scrolling near either edge fetches the next page with a keyset
+    query and drops rows from the far end; clicking a heading re-sorts in
+    SQL instead of in memory. Filters are query_expenses() keyword
+    arguments and are applied in SQL as well; a "search" filter switches
+    to relevance order until it is cleared.
+    """
+
+    COLUMNS = ("id", "amount", "category", "date", "description")
+    SORTABLE = ("id", "amount", "category", "date")
+    MAX_ROWS = 3 * EXPENSE_PAGE_SIZE
+    EDGE = 0.1  # fraction of the scroll range that triggers a page load
+
+    def __init__(self, parent, height=8, worker=None):
+        self.frame = ttk.Frame(parent)
+        self.worker = worker
+        self._job = None
+
+        self.tree = ttk.Treeview(self.frame, columns=self.COLUMNS, show="headings", height=height)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self._on_scroll)
+
+        self.tree.pack(side="left", fill="x", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        for col in self.SORTABLE:
+            self.tree.heading(col, command=lambda c=col: self.sort_by(c))
+        self.tree.column("id", width=70)
+        self.tree.column("amount", width=90)
+        self.tree.column("description", width=220)
+
+        self.sort = "date"
+        self.descending = True
+        self.filters = {}
+        self.category_filter = None  # names matching filters["category_ids"]
+        self.rows = {}
+        self.more_above = False
+        self.more_below = False
+        self._loading = False
+
+        self._update_headings()
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    # -------------------------
+    # Loading
+    # -------------------------
+    def reload(self):
+        """Drop everything and show the first page in the current sort order."""
+        if self._job is not None:
+            self._job.cancel()  # a page for the old order is no longer wanted
+        self._loading = True
+
+        @profiled("ui.expense_table_fill")
+        def show(rows):
+            self.tree.delete(*self.tree.get_children())
+            self.rows.clear()
+            for row in rows:
+                self._insert(row, "end")
+
+            self.more_above = False
+            self.more_below = len(rows) == EXPENSE_PAGE_SIZE
+            self.tree.yview_moveto(0)
+            self._loading = False
+
+        self._fetch(show)
+
+    def _fetch(self, on_done, **cursor):
+        """Fetch a page on the worker when there is one, inline otherwise."""
+        if self.worker is None:
+            on_done(get_expense_page(self.sort, self.descending, **cursor, **self.filters))
+            return
+
+        self._job = self.worker.read(
+            get_expense_page, self.sort, self.descending,
+            on_done=on_done, owner=self.tree, **cursor, **self.filters
+        )
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._loading:
+            return
+
+        first, last = float(first), float(last)
+        if last >= 1 - self.EDGE and self.more_below:
+            self._schedule(self._load_below)
+        elif first <= self.EDGE and self.more_above:
+            self._schedule(self._load_above)
+
+    def _schedule(self, load):
+        # yscrollcommand fires while items are being inserted, so defer the
+        # page load until Tk is idle and block re-entry until the page lands.
+        self._loading = True
+        self.tree.after_idle(load)
+
+    def _load_below(self):
+        items = self.tree.get_children()
+        if not items:
+            self._loading = False
+            return
+
+        def show(rows):
+            items = self.tree.get_children()
+            top = self._top_index()
+            for row in rows:
+                self._insert(row, "end")
+            self.more_below = len(rows) == EXPENSE_PAGE_SIZE
+
+            excess = len(items) + len(rows) - self.MAX_ROWS
+            if excess > 0:
+                self._drop(items[:excess])
+                self.more_above = True
+                self._scroll_to(top - excess)
+            self._loading = False
+
+        self._fetch(show, after=expense_sort_key(self.rows[items[-1]], self.sort))
+
+    def _load_above(self):
+        items = self.tree.get_children()
+        if not items:
+            self._loading = False
+            return
+
+        def show(rows):
+            items = self.tree.get_children()
+            top = self._top_index()
+            for i, row in enumerate(rows):
+                self._insert(row, i)
+            self.more_above = len(rows) == EXPENSE_PAGE_SIZE
+
+            excess = len(items) + len(rows) - self.MAX_ROWS
+            if excess > 0:
+                self._drop(items[len(items) - excess:])
+                self.more_below = True
+            self._scroll_to(top + len(rows))
+            self._loading = False
+
+        self._fetch(show, before=expense_sort_key(self.rows[items[0]], self.sort))
+
+    # -------------------------
+    # Sorting and filtering
+    # -------------------------
+    def set_filters(self, filters, category_names=None):
+        """Show only rows matching filters; category_names mirrors category_ids."""
+        searching = bool(fts_query(filters.get("search") or ""))
+        if searching and "search" not in self.filters:
+            self.sort, self.descending = "relevance", False
+        elif not searching and self.sort == "relevance":
+            self.sort, self.descending = "date", True
+        self.filters = {key: value for key, value in filters.items()
+                        if key != "search" or searching}
+        self.category_filter = set(category_names) if category_names is not None else None
+        self._update_headings()
+        self.reload()
+
+    def matches(self, row):
+        """
+        Whether an expense row passes the current filters. None while
+        searching: the FTS match can only be decided by a query.
+        """
+        _, amount, category, date = row[:4]
+        f = self.filters
+        if "search" in f:
+            return None
+        if "start" in f and date < f["start"]:
+            return False
+        if "end" in f and date >= f["end"]:
+            return False
+        if "min_amount" in f and amount < f["min_amount"]:
+            return False
+        if "max_amount" in f and amount > f["max_amount"]:
+            return False
+        if self.category_filter is not None and category not in self.category_filter:
+            return False
+        return True
+
+    def sort_by(self, column):
+        if column == self.sort:
+            self.descending = not self.descending
+        else:
+            self.sort = column
+            self.descending = column in ("date", "amount")
+        self._update_headings()
+        self.reload()
+
+    def _update_headings(self):
+        for col in self.COLUMNS:
+            arrow = ""
+            if col == self.sort:
+                arrow = " ▼" if self.descending else " ▲"
+            self.tree.heading(col, text=col.title() + arrow)
+
+    # -------------------------
+    # Helpers
+    # -------------------------
+    def _insert(self, row, index):
+        iid = str(row[0])
+        if iid in self.rows:
+            return  # already shown (added while this page was in flight)
+        self.rows[iid] = row
+        exp_id, cents, category, ts, description = row[:5]
+        self.tree.insert("", index, iid=iid, values=(
+            exp_id, format_amount(cents), category, format_timestamp(ts), description or ""))
+
+    def _drop(self, iids):
+        self.tree.delete(*iids)
+        for iid in iids:
+            del self.rows[iid]
+
+    def _top_index(self):
+        count = len(self.tree.get_children())
+        return round(float(self.tree.yview()[0]) * count)
+
+    def _scroll_to(self, index):
+        count = len(self.tree.get_children())
+        if count:
+            self.tree.yview_moveto(max(index, 0) / count)
+
+    # -------------------------
+    # Incremental updates
+    # -------------------------
+    def add_row(self, row):
+        """
+        Show a newly written row in place without reloading. Rows that sort
+        outside the loaded window are left for scrolling to fetch.
+        """
+        if not self.matches(row):
+            return
+
+        items = self.tree.get_children()
+        key = expense_sort_key(row, self.sort)
+
+        def comes_before(other):
+            other_key = expense_sort_key(self.rows[other], self.sort)
+            return key > other_key if self.descending else key < other_key
+
+        index = len(items)
+        for i, iid in enumerate(items):
+            if comes_before(iid):
+                index = i
+                break
+
+        if index == 0 and self.more_above:
+            return
+        if index == len(items) and self.more_below:
+            return
+        self._insert(row, index)
+
+    def remove_row(self, exp_id):
+        iid = str(exp_id)
+        if iid in self.rows:
+            self._drop([iid])
+
+    def selected_row(self):
+        sel = self.tree.selection()
+        return self.rows.get(sel[0]) if sel else None
+
+
 # -----------------------------
 # EXPENSE MANAGER
 # -----------------------------
+ALL_CATEGORIES = "All categories"
+SEARCH_DEBOUNCE_MS = 200
+REPEAT_CHOICES = {"Never": None, "Weekly": "weekly", "Monthly": "monthly", "Yearly": "yearly"}
+UPCOMING_MONTHS_BACK = 1
+UPCOMING_MONTHS_AHEAD = 1
+
+
+def _parse_filters(date_from, date_to, min_amount, max_amount):
+    """Turn the Expense Manager filter fields into query_expenses() arguments."""
+    filters = {}
+    try:
+        if date_from.strip():
+            filters["start"] = to_timestamp(datetime.strptime(date_from.strip(), "%Y-%m-%d"))
+        if date_to.strip():
+            # "To" is inclusive in the UI; the query's end is exclusive
+            end = datetime.strptime(date_to.strip(), "%Y-%m-%d") + timedelta(days=1)
+            filters["end"] = to_timestamp(end)
+    except ValueError:
+        raise ValueError("Dates must look like YYYY-MM-DD.") from None
+
+    try:
+        if min_amount.strip():
+            filters["min_amount"] = to_cents(min_amount)
+        if max_amount.strip():
+            filters["max_amount"] = to_cents(max_amount)
+    except ValueError:
+        raise ValueError("Amounts must be numbers.") from None
+
+    return filters
+
+
+def _add_expense_to_category(amount, category_name, description=None, frequency=None):
+    """
+    Worker-side half of "Add Expense": resolve the category, then insert.
+    With a frequency the expense also starts a recurring rule.
+    """
+    cat_id = category_id(category_name)
+    if cat_id is None:
+        raise LookupError(f"Category '{category_name}' not found.")
+    if frequency:
+        return add_recurring_expense(amount, cat_id, frequency, description)
+    return add_expense(amount, cat_id, description=description)
+
+
+def _upcoming_window():
+    """(start, end) of the Upcoming list: last month (overdue) to the end of next month."""
+    this_month = current_period()
+    return (period_bounds(shift_period(this_month, -UPCOMING_MONTHS_BACK))[0],
+            period_bounds(shift_period(this_month, UPCOMING_MONTHS_AHEAD))[1])
+
+
 def open_expense_manager(root, summary_labels):
     win = tk.Toplevel(root)
     win.title("Expense Manager")
     win.geometry("835x650")
-    apply_theme_to_window(win)
 
     # Scroll container
-    container = tk.Frame(win)
+    container = ttk.Frame(win)
     container.pack(fill="both", expand=True)
 
     canvas = tk.Canvas(container)
@@ -137,7 +445,7 @@ def open_expense_manager(root, summary_labels):
 
     canvas.configure(yscrollcommand=scrollbar.set)
 
-    content = tk.Frame(canvas)
+    content = ttk.Frame(canvas)
     canvas.create_window((0, 0), window=content, anchor="nw")
 
     def resize(event):
@@ -148,144 +456,336 @@ def open_expense_manager(root, summary_labels):
     # -----------------------------
     # ADD EXPENSE SECTION
     # -----------------------------
-    add_frame = tk.LabelFrame(content, text="Add Expense")
+    add_frame = ttk.LabelFrame(content, text="Add Expense")
     add_frame.pack(fill="x", padx=10, pady=10)
 
-    tk.Label(add_frame, text="Category:").grid(row=0, column=0, padx=5)
-    tk.Label(add_frame, text="Amount:").grid(row=0, column=2, padx=5)
+    ttk.Label(add_frame, text="Category:").grid(row=0, column=0, padx=5)
+    ttk.Label(add_frame, text="Amount:").grid(row=0, column=2, padx=5)
 
-    # Load categories properly
-    def get_category_names():
-        return [c[1] for c in get_categories()]
-
-    category_list = get_category_names()
-    if not category_list:
-        category_list = ["General"]
-
-    selected_category = tk.StringVar(value=category_list[0])
+    selected_category = tk.StringVar(value="")
 
     category_dropdown = ttk.Combobox(
-        add_frame, values=category_list, textvariable=selected_category, state="readonly"
+        add_frame, values=[], textvariable=selected_category, state="readonly"
     )
     category_dropdown.grid(row=0, column=1, padx=5)
 
-    amount_entry = tk.Entry(add_frame, width=10)
+    amount_entry = ttk.Entry(add_frame, width=10)
     amount_entry.grid(row=0, column=3, padx=5)
 
-    def refresh_dropdown():
-        names = get_category_names()
+    ttk.Label(add_frame, text="Description:").grid(row=0, column=4, padx=5)
+    description_entry = ttk.Entry(add_frame, width=24)
+    description_entry.grid(row=0, column=5, padx=5)
+
+    ttk.Label(add_frame, text="Repeat:").grid(row=1, column=0, padx=5, pady=(5, 0))
+    repeat_var = tk.StringVar(value="Never")
+    ttk.Combobox(add_frame, textvariable=repeat_var, values=list(REPEAT_CHOICES),
+                 state="readonly", width=10).grid(row=1, column=1, sticky="w", pady=(5, 0))
+
+    category_ids = {}
+
+    def fill_dropdown(categories):
+        category_ids.clear()
+        category_ids.update((name, cat_id) for cat_id, name in categories)
+
+        names = [c[1] for c in categories] or ["General"]
         category_dropdown["values"] = names
         if selected_category.get() not in names:
-            selected_category.set(names[0] if names else "")
+            selected_category.set(names[0])
+        filter_category["values"] = [ALL_CATEGORIES] + [c[1] for c in categories]
+
+    def refresh_dropdown():
+        worker.read(get_categories, key=("categories", str(win)), owner=win,
+                    on_done=fill_dropdown)
+
+    refresh_dropdown()
 
     def save_expense():
         try:
-            amt = float(amount_entry.get())
-        except:
+            amt = to_cents(amount_entry.get())
+        except ValueError:
             messagebox.showerror("Error", "Enter a valid number.")
             return
 
-        cat_name = selected_category.get()
+        frequency = REPEAT_CHOICES[repeat_var.get()]
+
+        def added(result):
+            row, before, after = result
+            amount_entry.delete(0, tk.END)
+            description_entry.delete(0, tk.END)
+            repeat_var.set("Never")
+            if expense_table.matches(row):
+                expense_table.add_row(row)
+                show_total(row[1])
+            # A new rule also changes the Upcoming list: let the refresh reload it.
+            if "search" not in expense_table.filters and not frequency:
+                refresher.advance(view, before, after)
+            refresher.notify()
+
+        worker.write(tracked, _add_expense_to_category, amt, selected_category.get(),
+                     description_entry.get(), frequency, owner=win, on_done=added,
+                     on_error=lambda exc: messagebox.showerror("Error", str(exc)))
+
+    ttk.Button(add_frame, text="Add Expense", command=save_expense).grid(
+        row=2, column=0, columnspan=6, pady=10
+    )
 
-        # CORRECT CATEGORY LOOKUP (fixed your bug)
-        categories = get_categories()
-        cat_id = next((c[0] for c in categories if c[1] == cat_name), None)
+    # -----------------------------
+    # FILTERS
+    # -----------------------------
+    filter_frame = ttk.LabelFrame(content, text="Filter")
+    filter_frame.pack(fill="x", padx=10, pady=(0, 10))
+
+    filter_entries = {}
+    for col, (label, key, width) in enumerate([
+        ("From:", "from", 11), ("To:", "to", 11), ("Min $:", "min", 8), ("Max $:", "max", 8),
+    ]):
+        ttk.Label(filter_frame, text=label).grid(row=0, column=col * 2, padx=(5, 2))
+        entry = ttk.Entry(filter_frame, width=width)
+        entry.grid(row=0, column=col * 2 + 1, padx=(0, 5))
+        filter_entries[key] = entry
+
+    ttk.Label(filter_frame, text="Category:").grid(row=1, column=0, padx=(5, 2), pady=5)
+    filter_category_var = tk.StringVar(value=ALL_CATEGORIES)
+    filter_category = ttk.Combobox(filter_frame, textvariable=filter_category_var,
+                                   values=[ALL_CATEGORIES], state="readonly", width=16)
+    filter_category.grid(row=1, column=1, columnspan=3, sticky="w", pady=5)
+
+    def apply_filters():
+        try:
+            filters = _parse_filters(
+                filter_entries["from"].get(), filter_entries["to"].get(),
+                filter_entries["min"].get(), filter_entries["max"].get(),
+            )
+        except ValueError as exc:
+            messagebox.showerror("Filter", str(exc))
+            return
 
-        if cat_id is None:
-            messagebox.showerror("Error", f"Category '{cat_name}' not found.")
+        names = None
+        category = filter_category_var.get()
+        if category != ALL_CATEGORIES:
+            filters["category_ids"] = [category_ids[category]]
+            names = [category]
+        search = search_entry.get().strip()
+        if search:
+            filters["search"] = search
+
+        expense_table.set_filters(filters, names)
+        show_total()
+
+    def clear_filters():
+        for entry in filter_entries.values():
+            entry.delete(0, tk.END)
+        search_entry.delete(0, tk.END)
+        filter_category_var.set(ALL_CATEGORIES)
+        expense_table.set_filters({})
+        show_total()
+
+    ttk.Button(filter_frame, text="Apply", command=apply_filters).grid(row=1, column=5, pady=5)
+    ttk.Button(filter_frame, text="Clear", command=clear_filters).grid(row=1, column=6, pady=5)
+
+    # Search runs as the user types, once typing pauses for SEARCH_DEBOUNCE_MS.
+    ttk.Label(filter_frame, text="Search:").grid(row=2, column=0, padx=(5, 2), pady=(0, 5))
+    search_entry = ttk.Entry(filter_frame, width=40)
+    search_entry.grid(row=2, column=1, columnspan=6, sticky="w", pady=(0, 5))
+    search_job = None
+
+    def run_search():
+        nonlocal search_job
+        search_job = None
+        text = search_entry.get().strip()
+        if text == expense_table.filters.get("search", ""):
             return
+        filters = dict(expense_table.filters, search=text)
+        expense_table.set_filters(filters, expense_table.category_filter)
+        show_total()
 
-        add_expense(amt, cat_id)
-        amount_entry.delete(0, tk.END)
-        load_expenses()
-        update_summary(summary_labels)
+    def schedule_search(event=None):
+        nonlocal search_job
+        if search_job is not None:
+            win.after_cancel(search_job)
+        search_job = win.after(SEARCH_DEBOUNCE_MS, run_search)
 
-    tk.Button(add_frame, text="Add Expense", command=save_expense).grid(
-        row=1, column=0, columnspan=4, pady=10
-    )
+    search_entry.bind("<KeyRelease>", schedule_search)
 
     # -----------------------------
     # EXPENSE TABLE
     # -----------------------------
-    table_frame = tk.LabelFrame(content, text="Expenses")
+    table_frame = ttk.LabelFrame(content, text="Expenses")
     table_frame.pack(fill="x", padx=10, pady=10)
 
-    cols = ("id", "amount", "category", "date")
-    expense_table = ttk.Treeview(table_frame, columns=cols, show="headings", height=8)
+    expense_table = PagedExpenseTable(table_frame, height=8, worker=worker)
     expense_table.pack(fill="x")
 
-    for col in cols:
-        expense_table.heading(col, text=col.title())
-
-    total_label = tk.Label(table_frame, text="Total: $0.00")
+    total_label = ttk.Label(table_frame, text="Total: $0.00")
     total_label.pack(pady=5)
 
-    def load_expenses():
-        for r in expense_table.get_children():
-            expense_table.delete(r)
+    total = 0
 
-        rows = get_expenses()
-        total = 0
+    def show_total(delta=None):
+        if delta is not None:
+            set_total(total + delta)
+        elif expense_table.filters:
+            worker.read(sum_expenses, key=("total", str(win)), owner=win,
+                        on_done=lambda result: set_total(result[1]), **expense_table.filters)
+        else:
+            # Unfiltered: the trigger-maintained running total, no scan
+            worker.read(get_expense_total, key=("total", str(win)), owner=win,
+                        on_done=set_total)
 
-        for rec in rows:
-            expense_table.insert("", "end", values=rec)
-            total += float(rec[1])
+    def set_total(value):
+        nonlocal total
+        total = value
+        total_label.config(text=f"Total: {format_money(total)}")
 
-        total_label.config(text=f"Total: ${total:.2f}")
+    # -----------------------------
+    # UPCOMING (recurring occurrences)
+    # -----------------------------
+    upcoming_frame = ttk.LabelFrame(content, text="Upcoming")
+    upcoming_frame.pack(fill="x", padx=10, pady=(0, 10))
+
+    upcoming_table = ttk.Treeview(upcoming_frame, columns=("date", "amount", "category", "description"),
+                                  show="headings", height=4)
+    for col in ("date", "amount", "category", "description"):
+        upcoming_table.heading(col, text=col.title())
+    upcoming_table.column("amount", width=90)
+    upcoming_table.pack(fill="x")
+    upcoming = {}  # iid -> Occurrence
+
+    def fill_upcoming(occurrences):
+        upcoming_table.delete(*upcoming_table.get_children())
+        upcoming.clear()
+        for occurrence in occurrences:
+            iid = f"{occurrence.rule_id}:{occurrence.ts}"
+            upcoming[iid] = occurrence
+            upcoming_table.insert("", "end", iid=iid, values=(
+                format_timestamp(occurrence.ts, "%Y-%m-%d"), format_amount(occurrence.amount),
+                occurrence.category or "Uncategorized", occurrence.description or ""))
+
+    def load_upcoming():
+        worker.read(pending_occurrences, *_upcoming_window(), key=("upcoming", str(win)),
+                    owner=upcoming_table, on_done=fill_upcoming)
+
+    def selected_occurrence():
+        sel = upcoming_table.selection()
+        return upcoming.get(sel[0]) if sel else None
+
+    def confirm_upcoming():
+        occurrence = selected_occurrence()
+        if occurrence is None:
+            return
 
+        def confirmed(result):
+            row, before, after = result
+            if row is not None and expense_table.matches(row):
+                expense_table.add_row(row)
+                show_total(row[1])
+            load_upcoming()
+            if "search" not in expense_table.filters:
+                refresher.advance(view, before, after)
+            refresher.notify()
+
+        worker.write(tracked, confirm_occurrence, occurrence.rule_id, occurrence.ts, owner=win,
+                     on_done=confirmed,
+                     on_error=lambda exc: messagebox.showerror("Error", str(exc)))
+
+    def skip_upcoming():
+        occurrence = selected_occurrence()
+        if occurrence is not None:
+            worker.write(skip_recurring, occurrence.rule_id, occurrence.ts, owner=win,
+                         on_done=lambda _: refresher.notify())
+
+    def stop_upcoming():
+        occurrence = selected_occurrence()
+        if occurrence is None:
+            return
+        if messagebox.askyesno("Confirm", "Stop repeating this expense? "
+                               "Expenses already recorded are kept."):
+            worker.write(end_recurring, occurrence.rule_id, owner=win,
+                         on_done=lambda _: refresher.notify())
+
+    upcoming_buttons = ttk.Frame(upcoming_frame)
+    upcoming_buttons.pack(pady=5)
+    ttk.Button(upcoming_buttons, text="Confirm", command=confirm_upcoming).pack(side="left", padx=5)
+    ttk.Button(upcoming_buttons, text="Skip", command=skip_upcoming).pack(side="left", padx=5)
+    ttk.Button(upcoming_buttons, text="Stop Repeating", style="Danger.TButton",
+               command=stop_upcoming).pack(side="left", padx=5)
+
+    @profiled("ui.load_expenses")
+    def load_expenses(revision=None):
+        expense_table.reload()
+        show_total()
+        load_upcoming()
+
+    view = ("expenses", str(win))
+    refresher.subscribe(view, load_expenses, owner=win, revision=current_revision())
     load_expenses()
 
-    tk.Button(table_frame, text="Refresh", command=load_expenses).pack(pady=5)
+    ttk.Button(table_frame, text="Refresh", command=load_expenses).pack(pady=5)
 
     def delete_expense_ui():
-        sel = expense_table.selection()
-        if not sel:
+        row = expense_table.selected_row()
+        if row is None:
             return
 
-        row = expense_table.item(sel[0])["values"]
         exp_id = row[0]
 
-        if messagebox.askyesno("Confirm", f"Delete expense {exp_id}?"):
-            delete_expense(exp_id)
-            load_expenses()
-            update_summary(summary_labels)
+        if not messagebox.askyesno("Confirm", f"Delete expense {exp_id}?"):
+            return
+
+        def deleted(result):
+            removed, before, after = result
+            expense_table.remove_row(exp_id)
+            if removed is not None:
+                show_total(-removed[1])
+                refresher.advance(view, before, after)
+            refresher.notify()
+
+        def failed(exc):
+            messagebox.showerror("Delete", str(exc), parent=win)
 
-    tk.Button(table_frame, text="Delete Selected", fg="red",
+        worker.write(tracked, delete_expense, exp_id, owner=win, on_done=deleted,
+                     on_error=failed)
+
+    ttk.Button(table_frame, text="Delete Selected", style="Danger.TButton",
               command=delete_expense_ui).pack(pady=5)
 
     # -----------------------------
     # CATEGORY MANAGER
     # -----------------------------
-    cat_header = tk.Button(content, text="▶ Categories", relief="flat", anchor="w")
+    cat_header = ttk.Button(content, text="▶ Categories", style="Flat.TButton")
     cat_header.pack(fill="x", padx=10, pady=(10, 0))
 
-    cat_frame = tk.Frame(content)
+    cat_frame = ttk.Frame(content)
     cat_open = False
 
     def build_cat_frame():
         for widget in cat_frame.winfo_children():
             widget.destroy()
 
-        add_cat_frame = tk.LabelFrame(cat_frame, text="Add Category")
+        add_cat_frame = ttk.LabelFrame(cat_frame, text="Add Category")
         add_cat_frame.pack(fill="x", pady=5)
 
-        tk.Label(add_cat_frame, text="Name:").grid(row=0, column=0, padx=5)
-        name_entry = tk.Entry(add_cat_frame, width=20)
+        ttk.Label(add_cat_frame, text="Name:").grid(row=0, column=0, padx=5)
+        name_entry = ttk.Entry(add_cat_frame, width=20)
         name_entry.grid(row=0, column=1)
 
         def add_new_cat():
             name = name_entry.get().strip()
             if not name:
                 return
-            add_category(name)
             name_entry.delete(0, tk.END)
-            load_cat()
-            refresh_dropdown()
 
-        tk.Button(add_cat_frame, text="Add", command=add_new_cat).grid(row=0, column=2, padx=5)
+            def added(_):
+                load_cat()
+                refresh_dropdown()
+                refresher.notify()
+
+            worker.write(add_category, name, owner=win, on_done=added)
+
+        ttk.Button(add_cat_frame, text="Add", command=add_new_cat).grid(row=0, column=2, padx=5)
 
         # Category table
-        cat_table_frame = tk.LabelFrame(cat_frame, text="Categories")
+        cat_table_frame = ttk.LabelFrame(cat_frame, text="Categories")
         cat_table_frame.pack(fill="x", pady=5)
 
         cat_table = ttk.Treeview(cat_table_frame, columns=("id", "name"),
@@ -295,12 +795,16 @@ def open_expense_manager(root, summary_labels):
         cat_table.heading("id", text="ID")
         cat_table.heading("name", text="Name")
 
-        def load_cat():
+        def fill_cat(rows):
             for r in cat_table.get_children():
                 cat_table.delete(r)
-            for row in get_categories():
+            for row in rows:
                 cat_table.insert("", "end", values=row)
 
+        def load_cat():
+            worker.read(get_categories, key=("category-table", str(win)), owner=cat_table,
+                        on_done=fill_cat)
+
         def delete_cat():
             sel = cat_table.selection()
             if not sel:
@@ -310,13 +814,17 @@ def open_expense_manager(root, summary_labels):
             cid, cname = row[0], row[1]
 
             if messagebox.askyesno("Confirm", f"Delete '{cname}'?"):
-                delete_category(cid)
-                load_cat()
-                refresh_dropdown()
+                def deleted(_):
+                    load_cat()
+                    refresh_dropdown()
+                    refresher.notify()
+
+                worker.write(delete_category, cid, owner=win, on_done=deleted)
 
         load_cat()
 
-        tk.Button(cat_frame, text="Delete Selected", fg="red", command=delete_cat).pack(pady=5)
+        ttk.Button(cat_frame, text="Delete Selected", style="Danger.TButton",
+                   command=delete_cat).pack(pady=5)
 
     def toggle_cat():
         nonlocal cat_open
@@ -325,7 +833,6 @@ def open_expense_manager(root, summary_labels):
             cat_header.config(text="▼ Categories")
             cat_frame.pack(fill="x", padx=10, pady=10)
             build_cat_frame()
-            apply_theme_to_window(win)
         else:
             cat_open = False
             cat_header.config(text="▶ Categories")
@@ -337,88 +844,272 @@ def open_expense_manager(root, summary_labels):
 # -----------------------------
 # CHART WINDOW
 # -----------------------------
+# There is at most one Charts window. Reopening it raises the existing
+# one, and refresh_charts_window() updates the drawn artists in place
+# when the data revision moves on, instead of rebuilding the figure.
+_charts = None
+_chart_data = (None, [], [], None)  # (revision, category names, totals, trends)
+
+
+def get_chart_data():
+    """
+    (revision, category names, totals, trends), recomputed only when the
+    data revision changes. trends is budget_analytics.trend_data(). Runs on
+    a worker thread; the cache is swapped as one tuple so readers never see
+    a half-updated entry.
+    """
+    global _chart_data
+    revision = get_revision()
+    if _chart_data[0] != revision:
+        from budget_analytics import trend_data
+
+        rows = get_category_totals()
+        cats = [name if name is not None else "Uncategorized" for name, _ in rows]
+        vals = [from_cents(total) for _, total in rows]
+        _chart_data = (revision, cats, vals, trend_data())
+    return _chart_data
+
+
+@profiled("ui.open_charts_window")
 def open_charts_window(root):
-    rows = get_expenses()
-    if not rows:
-        messagebox.showinfo("No Data", "No expenses available.")
+    if _charts is not None and _charts["win"].winfo_exists():
+        refresh_charts_window()
+        _charts["win"].deiconify()
+        _charts["win"].lift()
         return
 
-    totals = {}
-    for row in rows:
-        amount = float(row[1])
-        category = row[2]
-        totals[category] = totals.get(category, 0) + amount
+    worker.read(get_chart_data, key="charts", on_done=lambda data: _show_charts_window(root, data))
 
-    cats = list(totals.keys())
-    vals = list(totals.values())
 
-    win = tk.Toplevel(root)
-    win.title("Charts")
-    win.geometry("750x600")
-    apply_theme_to_window(win)
+@profiled("ui.show_charts_window")
+def _show_charts_window(root, data):
+    global _charts
+
+    if _charts is not None and _charts["win"].winfo_exists():
+        _apply_chart_data(data)  # opened twice before the first result arrived
+        return
 
-    fig = Figure(figsize=(8, 5), dpi=100)
+    revision, cats, vals, trends = data
+    if not cats:
+        messagebox.showinfo("No Data", "No expenses available.")
+        return
 
-    ax1 = fig.add_subplot(1, 2, 1)
-    ax1.pie(vals, labels=cats, autopct="%1.1f%%")
-    ax1.set_title("Expense Distribution")
+    Figure, FigureCanvasTkAgg = _load_matplotlib()
 
-    ax2 = fig.add_subplot(1, 2, 2)
-    ax2.bar(cats, vals)
-    ax2.set_title("Totals by Category")
-    ax2.tick_params(axis="x", rotation=45)
+    win = tk.Toplevel(root)
+    win.title("Charts")
+    win.geometry("900x800")
 
-    fig.tight_layout()
+    fig = Figure(figsize=(9, 7.5), dpi=100)
+    ax1 = fig.add_subplot(2, 2, 1)
+    ax2 = fig.add_subplot(2, 2, 2)
+    ax3 = fig.add_subplot(2, 2, 3)
+    ax4 = fig.add_subplot(2, 2, 4)
 
     canvas = FigureCanvasTkAgg(fig, win)
-    canvas.draw()
     canvas.get_tk_widget().pack(fill="both", expand=True)
 
-    tk.Button(win, text="Close", command=win.destroy).pack(pady=10)
+    def close():
+        global _charts
+        _charts = None
+        refresher.unsubscribe("charts")
+        win.destroy()
+
+    ttk.Button(win, text="Close", command=close).pack(pady=10)
+    win.protocol("WM_DELETE_WINDOW", close)
+
+    _charts = {"win": win, "fig": fig, "canvas": canvas,
+               "ax1": ax1, "ax2": ax2, "ax3": ax3, "ax4": ax4}
+    _plot_charts(revision, cats, vals, trends)
+    refresher.subscribe("charts", lambda _: refresh_charts_window(), owner=win,
+                        revision=revision)
+
+
+def refresh_charts_window():
+    """Bring an open Charts window up to date; cheap when nothing changed."""
+    if _charts is None or not _charts["win"].winfo_exists():
+        return
+    worker.read(get_chart_data, key="charts", owner=_charts["win"], on_done=_apply_chart_data)
+
+
+def _apply_chart_data(data):
+    if _charts is None:
+        return
+
+    revision, cats, vals, trends = data
+    if _charts["revision"] == revision:
+        return
+
+    if cats == _charts["cats"]:
+        _plot_trends(trends)
+        _update_charts(revision, vals)
+    else:
+        _plot_charts(revision, cats, vals, trends)
+
+
+@profiled("ui.plot_charts")
+def _plot_charts(revision, cats, vals, trends):
+    """Draw every chart from scratch (first open, or the category set changed)."""
+    ax1, ax2 = _charts["ax1"], _charts["ax2"]
+    ax1.clear()
+    ax2.clear()
+
+    if not cats:
+        ax1.set_title("No expenses")
+        for ax in (ax2, _charts["ax3"], _charts["ax4"]):
+            ax.clear()
+            ax.set_axis_off()
+        _charts.update(cats=[], revision=revision)
+        _charts["canvas"].draw_idle()
+        return
+
+    ax2.set_axis_on()
+    _plot_trends(trends)
+    wedges, texts, autotexts = draw_category_pie(ax1, cats, vals)
+    bars = draw_category_bars(ax2, cats, vals)
+
+    _charts["fig"].tight_layout()
+    _charts.update(
+        cats=list(cats), wedges=wedges, texts=texts, autotexts=autotexts,
+        bars=bars, revision=revision,
+    )
+    _charts["canvas"].draw_idle()
+
+
+@profiled("ui.update_charts")
+def _update_charts(revision, vals):
+    """Same categories, new totals: move the existing artists."""
+    total = sum(vals)
+    start = 0.0
+
+    for val, wedge, label, pct in zip(vals, _charts["wedges"], _charts["texts"], _charts["autotexts"]):
+        frac = val / total if total else 0
+        theta1, theta2 = 360 * start, 360 * (start + frac)
+        wedge.set_theta1(theta1)
+        wedge.set_theta2(theta2)
+
+        # Same placement rules as Axes.pie: labels at 1.1r, percentages at 0.6r
+        mid = math.radians((theta1 + theta2) / 2)
+        x, y = math.cos(mid), math.sin(mid)
+        label.set_position((1.1 * x, 1.1 * y))
+        label.set_horizontalalignment("left" if x > 0 else "right")
+        pct.set_position((0.6 * x, 0.6 * y))
+        pct.set_text(f"{frac * 100:.1f}%")
+        start += frac
+
+    for bar, val in zip(_charts["bars"], vals):
+        bar.set_height(val)
+    _charts["ax2"].relim()
+    _charts["ax2"].autoscale_view()
+
+    _charts["revision"] = revision
+    _charts["canvas"].draw_idle()
+
+
+def _plot_trends(trends):
+    """Monthly totals with their rolling average, and per-category percentiles.
+    These are small (one point per month / category), so they are redrawn."""
+    ax3, ax4 = _charts["ax3"], _charts["ax4"]
+    ax3.clear()
+    ax4.clear()
+    ax3.set_axis_on()
+    ax4.set_axis_on()
+
+    draw_monthly_trend(ax3, trends)
+    draw_percentiles(ax4, trends)
 
 
 # -----------------------------
 # MAIN UI
 # -----------------------------
-def main_ui():
+def main_ui(prewarm=True):
+    if budget_profile.is_enabled():
+        logging.basicConfig(level=logging.INFO)
+
+    root = build_main_ui()
+    if prewarm:
+        root.after(PREWARM_DELAY_MS, prewarm_matplotlib)
+
+    root.mainloop()
+    worker.shutdown()
+    close_connections()
+
+
+def build_main_ui():
+    """Create the dashboard window and return its root (without entering mainloop)."""
+    # Cheap after the first launch: migrate() returns as soon as it sees
+    # the schema version is current.
+    global worker, refresher
+
+    create_tables()
+
     root = tk.Tk()
+    worker = DBWorker(root)
+    refresher = RefreshScheduler(root, worker)
+    init_theme(root)
     root.title("Budget-er")
-    root.geometry("520x600")
+    root.geometry("520x710")
 
     # Header
-    header = tk.Frame(root, height=50)
+    header = ttk.Frame(root, height=50)
     header.pack(fill="x")
-    tk.Label(
+    ttk.Label(
         header,
         text="💰  Budget-er",
-        font=("Arial", 18, "bold"),
+        style="Header.TLabel",
         anchor="w",
-        padx=15
     ).pack(fill="both")
 
+    # Month navigation
+    period_frame = ttk.Frame(root)
+    period_frame.pack(pady=(10, 0))
+    period_label = ttk.Label(period_frame, width=16, style="Period.TLabel")
+
     # Input Panel
-    input_frame = tk.Frame(root)
+    input_frame = ttk.Frame(root)
     input_frame.pack(pady=15)
 
     labels = ["Income", "Expenses", "Savings", "Cash"]
     entries = {}
 
     for text in labels:
-        row = tk.Frame(input_frame)
+        row = ttk.Frame(input_frame)
         row.pack(fill="x", pady=3)
-        tk.Label(row, text=f"{text}:", width=12, anchor="w").pack(side="left")
-        entry = tk.Entry(row, width=20)
+        ttk.Label(row, text=f"{text}:", width=12, anchor="w").pack(side="left")
+        entry = ttk.Entry(row, width=20)
         entry.pack(side="right")
         entries[text.lower()] = entry
 
     # Load saved budget
-    b = get_budget()
-    if b:
-        entries["income"].insert(0, str(b[0]))
-        entries["savings"].insert(0, str(b[1]))
-        entries["cash"].insert(0, str(b[2]))
+    def fill_budget(period, b):
+        if period != selected_period:
+            return
+        for key, cents in zip(("income", "savings", "cash"), b or (0, 0, 0)):
+            entries[key].delete(0, "end")
+            entries[key].insert(0, format_amount(cents))
+
+    def show_period(months=0):
+        global selected_period
+        selected_period = shift_period(selected_period, months)
+        period_label.config(
+            text=datetime.strptime(selected_period, "%Y-%m").strftime("%B %Y"))
+        worker.read(get_budget, selected_period, key="budget",
+                    on_done=lambda b, period=selected_period: fill_budget(period, b))
+        if months:
+            update_summary(summary_labels)
+
+    ttk.Button(period_frame, text="◀", style="Flat.TButton", width=2,
+              command=lambda: show_period(-1)).pack(side="left")
+    period_label.pack(side="left")
+    ttk.Button(period_frame, text="▶", style="Flat.TButton", width=2,
+              command=lambda: show_period(1)).pack(side="left")
+
+    show_period()
 
     summary_labels = {
+        "spent": None,
+        "scheduled": None,
+        "projected": None,
         "remaining": None,
         "savings_percent": None,
         "weekly_allowance": None,
@@ -427,7 +1118,7 @@ def main_ui():
     }
 
     # Save button
-    tk.Button(
+    ttk.Button(
         root,
         text="Save",
         command=lambda: save_data(
@@ -440,81 +1131,346 @@ def main_ui():
     ).pack(pady=5)
 
     # Manage Expenses
-    tk.Button(
+    ttk.Button(
         root,
         text="Manage Expenses",
         command=lambda: open_expense_manager(root, summary_labels)
     ).pack(pady=5)
 
     # CSV
-    csv_frame = tk.Frame(root)
+    csv_frame = ttk.Frame(root)
     csv_frame.pack(pady=5)
 
-    tk.Button(csv_frame, text="Export CSV",
+    ttk.Button(csv_frame, text="Export CSV",
               command=lambda: _export_csv(root)).pack(side="left", padx=5)
 
-    tk.Button(csv_frame, text="Import CSV",
+    ttk.Button(csv_frame, text="Import CSV",
               command=lambda: _import_csv(root, summary_labels)).pack(side="left", padx=5)
 
+    # Snapshots
+    snapshot_frame = ttk.Frame(root)
+    snapshot_frame.pack(pady=5)
+
+    ttk.Button(snapshot_frame, text="Save Snapshot",
+              command=lambda: _save_snapshot(root)).pack(side="left", padx=5)
+
+    ttk.Button(snapshot_frame, text="Restore Snapshot",
+              command=lambda: _restore_snapshot(root, show_period)).pack(side="left", padx=5)
+
+    ttk.Button(snapshot_frame, text="Archive Old Years",
+              command=lambda: _archive_old_years(root)).pack(side="left", padx=5)
+
     # Summary Panel
-    summary_frame = tk.LabelFrame(root, text="Summary")
+    summary_frame = ttk.LabelFrame(root, text="Summary")
     summary_frame.pack(fill="x", padx=20, pady=10)
 
     rows = [
+        ("Spent:", "spent"),
+        ("Scheduled:", "scheduled"),
+        ("Projected:", "projected"),
         ("Remaining:", "remaining"),
         ("Savings %:", "savings_percent"),
         ("Weekly Allowance:", "weekly_allowance"),
     ]
 
     for label, key in rows:
-        line = tk.Frame(summary_frame)
+        line = ttk.Frame(summary_frame)
         line.pack(fill="x", pady=3)
-        tk.Label(line, text=label).pack(side="left")
-        val = tk.Label(line, text="")
+        ttk.Label(line, text=label).pack(side="left")
+        val = ttk.Label(line, text="")
         val.pack(side="right")
         summary_labels[key] = val
 
-    summary_labels["overspending"] = tk.Label(root, fg="red")
+    summary_labels["overspending"] = ttk.Label(root, style="Warning.TLabel")
     summary_labels["overspending"].pack()
-    summary_labels["negative_cash"] = tk.Label(root, fg="red")
+    summary_labels["negative_cash"] = ttk.Label(root, style="Warning.TLabel")
     summary_labels["negative_cash"].pack()
 
     # Charts
-    tk.Button(root, text="Charts", width=15,
+    ttk.Button(root, text="Charts", width=15,
               command=lambda: open_charts_window(root)).pack(pady=5)
 
     # Theme Toggle
-    tk.Button(root, text="Toggle Theme",
+    ttk.Button(root, text="Toggle Theme",
               command=lambda: toggle_theme(root)).pack(pady=10)
 
-    apply_theme(root)
+    # Hidden diagnostics menu
+    root.bind_all("<Control-Alt-p>", lambda event: _show_diagnostics_menu(root, event))
+
+    refresher.subscribe("summary", lambda _: update_summary(summary_labels),
+                        revision=current_revision())
     update_summary(summary_labels)
 
-    root.mainloop()
+    return root
+
+
+# -----------------------------
+# DIAGNOSTICS (Ctrl+Alt+P)
+# -----------------------------
+def _show_diagnostics_menu(root, event):
+    menu = tk.Menu(root, tearoff=0)
+    if budget_profile.is_enabled():
+        menu.add_command(label="Show Profile Report", command=lambda: _show_profile_report(root))
+        menu.add_command(label="Save Profile Report...", command=_save_profile_report)
+        menu.add_command(label="Reset Profile", command=budget_profile.reset)
+        menu.add_separator()
+        menu.add_command(label="Stop Profiling", command=budget_profile.disable)
+    else:
+        menu.add_command(label="Start Profiling", command=_start_profiling)
+    menu.tk_popup(event.x_root, event.y_root)
+
+
+def _start_profiling():
+    budget_profile.enable()
+    # Reopen connections so statements are timed too
+    close_connections()
+
+
+def _show_profile_report(root):
+    win = tk.Toplevel(root)
+    win.title("Profile Report")
+    win.geometry("900x500")
+
+    text = tk.Text(win, font=("Courier", 9), wrap="none")
+    text.insert("1.0", budget_profile.report())
+    text.configure(state="disabled")
+    text.pack(fill="both", expand=True)
+
+
+def _save_profile_report():
+    path = filedialog.asksaveasfilename(
+        defaultextension=".txt",
+        filetypes=[("Text Files", "*.txt")]
+    )
+    if path:
+        budget_profile.dump(path)
 
 
 # CSV helper functions
 def _export_csv(root):
     path = filedialog.asksaveasfilename(
         defaultextension=".csv",
-        filetypes=[("CSV Files", "*.csv")]
+        filetypes=[("CSV Files", "*.csv"), ("Compressed CSV", "*.csv.gz")]
     )
     if not path:
         return
-    export_expenses_csv(path)
-    messagebox.showinfo("Export", "Expenses exported successfully.")
+
+    worker.read(
+        export_expenses_csv, path,
+        on_done=lambda count: messagebox.showinfo(
+            "Export", f"Exported {count:,} expenses successfully."),
+        on_error=lambda exc: messagebox.showerror("Export", f"Export failed: {exc}"),
+    )
 
 
 def _import_csv(root, summary_labels):
-    path = filedialog.askopenfilename(
+    """Import one CSV, or several at once through the process-pool bulk import."""
+    paths = filedialog.askopenfilenames(
         filetypes=[("CSV Files", "*.csv"), ("All Files", "*.*")]
     )
+    if not paths:
+        return
+
+    win = tk.Toplevel(root)
+    win.title("Importing")
+    win.geometry("360x130")
+    win.transient(root)
+
+    status = ttk.Label(win, text="Starting import...")
+    status.pack(pady=(15, 5))
+    bar = ttk.Progressbar(win, length=300, mode="determinate", maximum=100)
+    bar.pack(pady=5)
+
+    # Not job.cancel(): that would drop the report of what was kept.
+    cancel_requested = threading.Event()
+    job = None
+
+    def cancel():
+        cancel_requested.set()
+        status.config(text="Cancelling...")
+
+    ttk.Button(win, text="Cancel", command=cancel).pack(pady=5)
+    win.protocol("WM_DELETE_WINDOW", cancel)
+
+    def show_progress(rows, done, total):
+        if win.winfo_exists():
+            bar["value"] = done * 100 / total if total else 100
+            files = f" ({done} of {total} files)" if len(paths) > 1 else ""
+            status.config(text=f"Imported {rows:,} expenses{files}...")
+
+    def progress(rows, done, total):
+        # Called on the writer thread: hand the numbers to Tk, never touch it here.
+        worker.post(show_progress, rows, done, total)
+        return not (cancel_requested.is_set() or (job is not None and job.cancelled))
+
+    def finished():
+        if win.winfo_exists():
+            win.destroy()
+        refresher.notify()
+
+    def failed(exc):
+        finished()
+        messagebox.showerror("Import", f"Import failed: {exc}")
+
+    def done(report):
+        finished()
+
+        message = f"Imported {report['imported']:,} new expenses."
+        if report["duplicates"]:
+            message += f" Skipped {report['duplicates']:,} already imported."
+        if report["cancelled"]:
+            message = "Import cancelled. " + message
+        if report["errors"]:
+            message += f"\n\nSkipped {len(report['errors']):,} invalid rows:"
+            for where, error in report["errors"][:10]:
+                where = f"line {where}" if isinstance(where, int) else where
+                message += f"\n  {where}: {error}"
+            if len(report["errors"]) > 10:
+                message += "\n  ..."
+        messagebox.showinfo("Import", message)
+
+    if len(paths) == 1:
+        job = worker.write(import_expenses_csv, paths[0], progress=progress,
+                           on_done=done, on_error=failed)
+    else:
+        job = worker.write(import_expense_files, paths, progress=progress,
+                           on_done=done, on_error=failed)
+
+
+# -----------------------------
+# SNAPSHOT / RESTORE
+# -----------------------------
+PROGRESS_STAGES = {
+    "copy": "Copying", "compress": "Compressing", "decompress": "Decompressing",
+    "archive": "Archiving", "vacuum": "Compacting",
+}
+
+
+def _run_with_progress(root, title, submit):
+    """
+    Show a cancellable progress window for a long budget_db call.
+    submit(progress, close) starts the job: progress is passed to the call
+    and runs on a worker thread as progress(stage, done, total); close()
+    removes the window once the job has finished.
+    """
+    win = tk.Toplevel(root)
+    win.title(title)
+    win.geometry("360x130")
+    win.transient(root)
+
+    status = ttk.Label(win, text="Starting...")
+    status.pack(pady=(15, 5))
+    bar = ttk.Progressbar(win, length=300, mode="determinate", maximum=100)
+    bar.pack(pady=5)
+
+    cancel_requested = threading.Event()
+
+    def cancel():
+        cancel_requested.set()
+        status.config(text="Cancelling...")
+
+    ttk.Button(win, text="Cancel", command=cancel).pack(pady=5)
+    win.protocol("WM_DELETE_WINDOW", cancel)
+
+    def show_progress(stage, done, total):
+        if win.winfo_exists() and not cancel_requested.is_set():
+            bar["value"] = done * 100 / total if total else 100
+            status.config(text=f"{PROGRESS_STAGES.get(stage, stage)}...")
+
+    def progress(stage, done, total):
+        worker.post(show_progress, stage, done, total)
+        return not cancel_requested.is_set()
+
+    def close():
+        if win.winfo_exists():
+            win.destroy()
+
+    submit(progress, close)
+
+
+def _save_snapshot(root):
+    path = filedialog.asksaveasfilename(
+        defaultextension=".db",
+        filetypes=[("Snapshot", "*.db"), ("Compressed snapshot", "*.db.gz")]
+    )
     if not path:
         return
-    import_expenses_csv(path)
-    update_summary(summary_labels)
-    messagebox.showinfo("Import", "Expenses imported successfully.")
+
+    def submit(progress, close):
+        def done(completed):
+            close()
+            if completed:
+                messagebox.showinfo("Snapshot", "Snapshot saved.")
+
+        def failed(exc):
+            close()
+            messagebox.showerror("Snapshot", f"Snapshot failed: {exc}")
+
+        # A read: the copy runs beside the writer instead of queueing behind it.
+        worker.read(snapshot_database, path, progress=progress, on_done=done, on_error=failed)
+
+    _run_with_progress(root, "Saving Snapshot", submit)
+
+
+def _restore_snapshot(root, on_restored):
+    path = filedialog.askopenfilename(
+        filetypes=[("Snapshots", "*.db *.db.gz"), ("All Files", "*.*")]
+    )
+    if not path:
+        return
+    if not messagebox.askyesno(
+            "Restore", "Replace all current data with this snapshot?", icon="warning"):
+        return
+
+    def submit(progress, close):
+        def done(completed):
+            close()
+            if completed:
+                on_restored()
+                refresher.notify()
+                messagebox.showinfo("Restore", "Snapshot restored.")
+
+        def failed(exc):
+            close()
+            messagebox.showerror("Restore", f"Restore failed: {exc}")
+
+        worker.write(restore_snapshot, path, progress=progress, on_done=done, on_error=failed)
+
+    _run_with_progress(root, "Restoring Snapshot", submit)
+
+
+def _archive_old_years(root):
+    last = datetime.now().year - 1
+    year = simpledialog.askinteger(
+        "Archive Old Years",
+        "Move expenses up to the end of this year into per-year archive files.\n"
+        "Archived years stay in listings, totals and search, but are read-only.",
+        parent=root, initialvalue=last - 1, maxvalue=last)
+    if year is None:
+        return
+
+    def submit(progress, close):
+        def done(years):
+            close()
+            refresher.notify()
+            if years:
+                messagebox.showinfo("Archive", f"Archived {', '.join(map(str, years))}.")
+            else:
+                messagebox.showinfo("Archive", "Nothing to archive.")
+
+        def failed(exc):
+            close()
+            messagebox.showerror("Archive", f"Archiving failed: {exc}")
+
+        worker.write(archive_years, year, progress=progress, on_done=done, on_error=failed)
+
+    _run_with_progress(root, "Archiving", submit)
 
 
 if __name__ == "__main__":
+    # Bulk import parses in spawned processes; frozen builds need this.
+    # Imported here so a normal launch does not pay for multiprocessing.
+    import multiprocessing
+
+    multiprocessing.freeze_support()
     main_ui()
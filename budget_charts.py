@@ -0,0 +1,49 @@
+# -----------------------------
+# CHART DRAWING
+# -----------------------------
+# How each chart looks, independent of where it is shown: these only
+# take matplotlib Axes, so the Tk Charts window (FigureCanvasTkAgg) and
+# headless reports (Agg, budget_report) draw identical charts. Nothing
+# here imports matplotlib; callers that already have it build the Axes.
+# Values are in currency units (budget_units.from_cents).
+
+
+def draw_category_pie(ax, cats, vals):
+    """Share of spending per category. Returns Axes.pie()'s (wedges, texts, autotexts)."""
+    wedges, texts, autotexts = ax.pie(vals, labels=cats, autopct="%1.1f%%")
+    ax.set_title("Expense Distribution")
+    return wedges, texts, autotexts
+
+
+def draw_category_bars(ax, cats, vals):
+    """Total per category. Returns the bar container."""
+    bars = ax.bar(cats, vals)
+    ax.set_title("Totals by Category")
+    ax.tick_params(axis="x", rotation=45)
+    return bars
+
+
+def draw_monthly_trend(ax, trends):
+    """Monthly totals, pending recurring expenses stacked on top, and the rolling average."""
+    periods = trends["periods"]
+    ax.bar(periods, trends["totals"], color="#9ecae1", label="Monthly total")
+    if any(trends["scheduled"]):
+        ax.bar(periods, trends["scheduled"], bottom=trends["totals"], color="#c6dbef",
+               hatch="//", edgecolor="#6baed6", label="Scheduled")
+    ax.plot(periods, trends["rolling"], color="#08519c", marker=".",
+            label="3-month average")
+    ax.set_title("Monthly Trend")
+    ax.legend(fontsize="small")
+    step = max(1, len(periods) // 8)
+    ax.set_xticks(range(0, len(periods), step))
+    ax.set_xticklabels(periods[::step], rotation=45, fontsize="small")
+
+
+def draw_percentiles(ax, trends):
+    """Median and 90th-percentile single expense per category."""
+    cats = trends["categories"]
+    ax.barh(cats, trends["p90"], color="#fdae6b", label="90th percentile")
+    ax.barh(cats, trends["p50"], color="#e6550d", label="Median")
+    ax.invert_yaxis()
+    ax.set_title("Typical Expense by Category")
+    ax.legend(fontsize="small")
@@ -1,22 +1,200 @@
 import sqlite3
 import csv
+import gzip
+import hashlib
+import heapq
+import os
+import tempfile
+import threading
+from collections import Counter, deque, namedtuple
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+from budget_profile import profiled, connection_factory
+from budget_units import format_amount, format_timestamp, now_timestamp, to_cents, to_timestamp
 
 DB_NAME = "budget.db"
 
 # -----------------------------
 # DATABASE CONNECTION
 # -----------------------------
+# Connections are kept open for the life of the process, one per thread
+# (sqlite3 connections must not be shared across threads). WAL lets a
+# second app instance or a script read while we write, and busy_timeout
+# makes writers wait for each other instead of failing with
+# "database is locked".
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_generation = 0
+
+# Bumped after every committed write made through transaction(), and when
+# PRAGMA data_version shows another process has committed. Views compare
+# it with the revision they last drew to skip work when nothing changed.
+#
+# data_version also moves when another thread's connection in this
+# process commits, and that commit has already been counted. So each
+# connection remembers how many local commits there had been when it
+# last looked: a change seen with no local commit since came from
+# another process. That change is counted once for the process, not
+# once per connection that notices it. A writer checks just before it
+# commits, while it holds the write lock, so an outside commit that came
+# first is counted first and the write's own bump is never all that
+# changed. Everything here happens under _revision_lock, which
+# get_revision() reads under too, so a reader never sees a commit
+# half-counted.
+_revision = 0
+_commits = 0  # transaction() commits in this process
+_external = 0  # commits by other processes noticed so far
+_revision_lock = threading.Lock()
+
+
+def _open(path):
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=connection_factory(),
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-8000")
+    return conn
+
+
 def connect():
-    return sqlite3.connect(DB_NAME)
+    """Return this thread's connection to DB_NAME, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_NAME and _local.generation == _generation:
+        return conn
+
+    if conn is not None:
+        _forget(conn)
+        conn.close()
+        _bump_revision()
+
+    conn = _open(DB_NAME)
+    _local.conn = conn
+    _local.path = DB_NAME
+    _local.generation = _generation
+    _local.attached = {}  # archive schema -> path, least recently used first
+    _local.view = None  # schemas in the expenses_all view
+    # Baseline for get_revision(): commits by others from here on bump it.
+    with _revision_lock:
+        _local.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        _local.commits = _commits
+        _local.external = _external
+    with _connections_lock:
+        _connections.append(conn)
+    return conn
+
+
+def _forget(conn):
+    with _connections_lock:
+        if conn in _connections:
+            _connections.remove(conn)
+
+
+@contextmanager
+def transaction():
+    """
+    Run a block of writes as one IMMEDIATE transaction.
+
+    Taking the write lock up front means a second writer waits on
+    busy_timeout instead of failing when its read lock can't be upgraded.
+    """
+    conn = connect()
+    if conn.in_transaction:
+        # Nested use joins the outer transaction.
+        yield conn.cursor()
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    global _revision, _commits
+    with _revision_lock:
+        _check_external(conn)
+        conn.commit()
+        _revision += 1
+        _commits += 1
+        _local.commits = _commits  # its own commits never move its data_version
+
+
+def _bump_revision():
+    global _revision
+    with _revision_lock:
+        _revision += 1
+
+
+def _check_external(conn):
+    """
+    Count a commit by another process if conn's data_version shows one
+    that no other connection has counted yet. Call under _revision_lock.
+    """
+    global _revision, _external
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if (version != _local.data_version and _local.commits == _commits
+            and _local.external == _external):
+        _revision += 1
+        _external += 1
+    _local.data_version = version
+    _local.commits = _commits
+    _local.external = _external
+
+
+def get_revision():
+    """A number that changes whenever the database contents may have changed."""
+    conn = connect()
+    with _revision_lock:
+        _check_external(conn)
+        return _revision
+
+
+def current_revision():
+    """The revision as of this process's last commit or check; no query."""
+    return _revision
+
+
+def close_connections():
+    """Close every cached connection (call on shutdown or before swapping DB files)."""
+    global _generation
+
+    with _connections_lock:
+        _generation += 1
+        conns = list(_connections)
+        _connections.clear()
+
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # owned by another thread; that thread reopens on its next call
+
+    _local.__dict__.clear()
+    _bump_revision()
 
 
 # -----------------------------
-# CREATE TABLES
+# SCHEMA MIGRATIONS
 # -----------------------------
-def create_tables():
-    conn = connect()
-    cur = conn.cursor()
+# The schema version lives in PRAGMA user_version. Each migration moves
+# the database up by exactly one version and runs inside the same
+# transaction as the version bump, so an interrupted upgrade leaves the
+# file at the previous version. Databases created before versioning
+# report version 0 and pass through every step.
+def _migration_1(cur):
+    """Base tables (CREATE IF NOT EXISTS so pre-versioning files upgrade in place)."""
 
     # -------------------------
     # MAIN BUDGET TABLE
@@ -64,157 +242,2287 @@ def create_tables():
         )
     """)
 
-    conn.commit()
-    conn.close()
+
+def _migration_2(cur):
+    """Covering indexes for the date-ordered listing and per-category lookups."""
+    # (date, amount, category_id) + the implicit rowid covers get_expenses()
+    # entirely, so the ORDER BY walks the index backwards with no sort step.
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_expenses_date
+        ON expenses (date, amount, category_id)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_expenses_category
+        ON expenses (category_id, amount)
+    """)
+
+
+def _migration_3(cur):
+    """Running totals kept exact by triggers, so summaries never scan expenses."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS expense_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    # category_id 0 collects expenses with no category
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS category_totals (
+            category_id INTEGER PRIMARY KEY,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    # Backfill from whatever history already exists
+    cur.execute("DELETE FROM expense_summary")
+    cur.execute("""
+        INSERT INTO expense_summary (id, total, count)
+        SELECT 1, IFNULL(SUM(amount), 0), COUNT(*) FROM expenses
+    """)
+    cur.execute("DELETE FROM category_totals")
+    cur.execute("""
+        INSERT INTO category_totals (category_id, total, count)
+        SELECT IFNULL(category_id, 0), SUM(amount), COUNT(*)
+        FROM expenses
+        GROUP BY IFNULL(category_id, 0)
+    """)
+
+    # Triggers run inside the writing statement's transaction, so the
+    # totals commit (or roll back) atomically with the expense itself.
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_insert
+        AFTER INSERT ON expenses
+        BEGIN
+            UPDATE expense_summary
+            SET total = total + NEW.amount, count = count + 1
+            WHERE id = 1;
+
+            INSERT INTO category_totals (category_id, total, count)
+            VALUES (IFNULL(NEW.category_id, 0), NEW.amount, 1)
+            ON CONFLICT (category_id) DO UPDATE
+            SET total = total + excluded.total, count = count + 1;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_delete
+        AFTER DELETE ON expenses
+        BEGIN
+            UPDATE expense_summary
+            SET total = total - OLD.amount, count = count - 1
+            WHERE id = 1;
+
+            UPDATE category_totals
+            SET total = total - OLD.amount, count = count - 1
+            WHERE category_id = IFNULL(OLD.category_id, 0);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_update
+        AFTER UPDATE OF amount, category_id ON expenses
+        BEGIN
+            UPDATE expense_summary
+            SET total = total - OLD.amount + NEW.amount
+            WHERE id = 1;
+
+            UPDATE category_totals
+            SET total = total - OLD.amount, count = count - 1
+            WHERE category_id = IFNULL(OLD.category_id, 0);
+
+            INSERT INTO category_totals (category_id, total, count)
+            VALUES (IFNULL(NEW.category_id, 0), NEW.amount, 1)
+            ON CONFLICT (category_id) DO UPDATE
+            SET total = total + excluded.total, count = count + 1;
+        END
+    """)
+
+
+def _migration_4(cur):
+    """Indexes whose order matches the Expense Manager's keyset pagination."""
+    # Put id right after date so ORDER BY date, id (the page key) is read
+    # straight off the index; amount and category_id keep it covering.
+    cur.execute("DROP INDEX IF EXISTS idx_expenses_date")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_expenses_date
+        ON expenses (date, id, amount, category_id)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_expenses_amount
+        ON expenses (amount, id)
+    """)
+
+
+def _migration_5(cur):
+    """Monthly budget periods and per-period, per-category rollups."""
+    # One budget row per "YYYY-MM". Months without their own row inherit
+    # the most recent earlier one (or the legacy single budget row).
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS budgets (
+            period TEXT PRIMARY KEY,
+            income REAL DEFAULT 0,
+            savings REAL DEFAULT 0,
+            cash REAL DEFAULT 0
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS period_totals (
+            period TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, category_id)
+        ) WITHOUT ROWID
+    """)
+
+    cur.execute("DELETE FROM period_totals")
+    cur.execute("""
+        INSERT INTO period_totals (period, category_id, total, count)
+        SELECT substr(date, 1, 7), IFNULL(category_id, 0), SUM(amount), COUNT(*)
+        FROM expenses
+        GROUP BY 1, 2
+    """)
+
+    # Same pattern as the running totals: kept exact inside the writer's
+    # transaction. The period is the "YYYY-MM" prefix of the date.
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_period_insert
+        AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO period_totals (period, category_id, total, count)
+            VALUES (substr(NEW.date, 1, 7), IFNULL(NEW.category_id, 0), NEW.amount, 1)
+            ON CONFLICT (period, category_id) DO UPDATE
+            SET total = total + excluded.total, count = count + 1;
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_period_delete
+        AFTER DELETE ON expenses
+        BEGIN
+            UPDATE period_totals
+            SET total = total - OLD.amount, count = count - 1
+            WHERE period = substr(OLD.date, 1, 7)
+              AND category_id = IFNULL(OLD.category_id, 0);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_period_update
+        AFTER UPDATE OF amount, category_id, date ON expenses
+        BEGIN
+            UPDATE period_totals
+            SET total = total - OLD.amount, count = count - 1
+            WHERE period = substr(OLD.date, 1, 7)
+              AND category_id = IFNULL(OLD.category_id, 0);
+
+            INSERT INTO period_totals (period, category_id, total, count)
+            VALUES (substr(NEW.date, 1, 7), IFNULL(NEW.category_id, 0), NEW.amount, 1)
+            ON CONFLICT (period, category_id) DO UPDATE
+            SET total = total + excluded.total, count = count + 1;
+        END
+    """)
+
+
+def _migration_6(cur):
+    """Integer cents and epoch-second timestamps (see budget_units)."""
+    # -------------------------
+    # EXPENSES: rebuild with integer columns
+    # -------------------------
+    # AUTOINCREMENT's high-water mark is carried over so ids of deleted
+    # expenses are never handed out again.
+    cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'")
+    row = cur.fetchone()
+    sequence = row[0] if row else None
+
+    cur.execute("""
+        CREATE TABLE expenses_v6 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount_cents INTEGER NOT NULL,
+            category_id INTEGER,
+            ts INTEGER NOT NULL,
+            FOREIGN KEY (category_id) REFERENCES categories(id)
+        )
+    """)
+    cur.execute("""
+        INSERT INTO expenses_v6 (id, amount_cents, category_id, ts)
+        SELECT id, CAST(ROUND(amount * 100) AS INTEGER), category_id,
+               CAST(strftime('%s', date) AS INTEGER)
+        FROM expenses
+        WHERE strftime('%s', date) IS NOT NULL
+    """)
+    # Dates SQLite cannot parse (never written by the app itself, but
+    # possible in rows typed in by hand, e.g. "01/15/2024") go through
+    # budget_units' input formats. One that still does not parse stops
+    # the upgrade: guessing a date would file the expense in the wrong
+    # period.
+    cur.execute("SELECT id, date FROM expenses WHERE strftime('%s', date) IS NULL")
+    parsed = []
+    for exp_id, value in cur.fetchall():
+        try:
+            parsed.append((to_timestamp(str(value)), exp_id))
+        except ValueError:
+            raise ValueError(
+                f"cannot upgrade the database: expense {exp_id} has the date {value!r}, "
+                "which is not a recognized date; correct it and restart"
+            ) from None
+    cur.executemany("""
+        INSERT INTO expenses_v6 (id, amount_cents, category_id, ts)
+        SELECT id, CAST(ROUND(amount * 100) AS INTEGER), category_id, ?
+        FROM expenses
+        WHERE id = ?
+    """, parsed)
+    cur.execute("DROP TABLE expenses")  # also drops its indexes and triggers
+    cur.execute("ALTER TABLE expenses_v6 RENAME TO expenses")
+    if sequence is not None:
+        cur.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'",
+                    (sequence,))
+
+    cur.execute("""
+        CREATE INDEX idx_expenses_date
+        ON expenses (ts, id, amount_cents, category_id)
+    """)
+    cur.execute("""
+        CREATE INDEX idx_expenses_category
+        ON expenses (category_id, amount_cents)
+    """)
+    cur.execute("""
+        CREATE INDEX idx_expenses_amount
+        ON expenses (amount_cents, id)
+    """)
+
+    # -------------------------
+    # BUDGETS: cents, and the legacy single row becomes the fallback period
+    # -------------------------
+    cur.execute("""
+        CREATE TABLE budgets_v6 (
+            period TEXT PRIMARY KEY,
+            income_cents INTEGER NOT NULL DEFAULT 0,
+            savings_cents INTEGER NOT NULL DEFAULT 0,
+            cash_cents INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        INSERT INTO budgets_v6 (period, income_cents, savings_cents, cash_cents)
+        SELECT period, CAST(ROUND(IFNULL(income, 0) * 100) AS INTEGER),
+               CAST(ROUND(IFNULL(savings, 0) * 100) AS INTEGER),
+               CAST(ROUND(IFNULL(cash, 0) * 100) AS INTEGER)
+        FROM budgets
+    """)
+    cur.execute(f"""
+        INSERT OR IGNORE INTO budgets_v6 (period, income_cents, savings_cents, cash_cents)
+        SELECT '{BASE_PERIOD}', CAST(ROUND(IFNULL(income, 0) * 100) AS INTEGER),
+               CAST(ROUND(IFNULL(savings, 0) * 100) AS INTEGER),
+               CAST(ROUND(IFNULL(cash, 0) * 100) AS INTEGER)
+        FROM budget
+        ORDER BY id
+        LIMIT 1
+    """)
+    cur.execute("DROP TABLE budgets")
+    cur.execute("DROP TABLE budget")
+    cur.execute("ALTER TABLE budgets_v6 RENAME TO budgets")
+
+    # -------------------------
+    # ROLLUPS: integer totals, rebuilt from the converted rows
+    # -------------------------
+    cur.execute("DROP TABLE expense_summary")
+    cur.execute("DROP TABLE category_totals")
+    cur.execute("DROP TABLE period_totals")
+
+    cur.execute("""
+        CREATE TABLE expense_summary (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE category_totals (
+            category_id INTEGER PRIMARY KEY,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE period_totals (
+            period TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, category_id)
+        ) WITHOUT ROWID
+    """)
+
+    cur.execute("""
+        INSERT INTO expense_summary (id, total_cents, count)
+        SELECT 1, IFNULL(SUM(amount_cents), 0), COUNT(*) FROM expenses
+    """)
+    cur.execute("""
+        INSERT INTO category_totals (category_id, total_cents, count)
+        SELECT IFNULL(category_id, 0), SUM(amount_cents), COUNT(*)
+        FROM expenses
+        GROUP BY 1
+    """)
+    cur.execute(f"""
+        INSERT INTO period_totals (period, category_id, total_cents, count)
+        SELECT {PERIOD_SQL.format(ts="ts")}, IFNULL(category_id, 0), SUM(amount_cents), COUNT(*)
+        FROM expenses
+        GROUP BY 1, 2
+    """)
+
+    _create_total_triggers(cur)
+
+
+# "YYYY-MM" of an expense timestamp, as SQL; {ts} is the column expression.
+PERIOD_SQL = "strftime('%Y-%m', {ts}, 'unixepoch')"
+
+# Budget row that applies before the first month with its own budget.
+BASE_PERIOD = "0000-00"
+
+
+def _create_total_triggers(cur):
+    """
+    Keep expense_summary, category_totals and period_totals exact. Triggers
+    run inside the writing statement's transaction, so the totals commit
+    (or roll back) atomically with the expense itself.
+    """
+    new_period = PERIOD_SQL.format(ts="NEW.ts")
+    old_period = PERIOD_SQL.format(ts="OLD.ts")
+
+    cur.execute(f"""
+        CREATE TRIGGER trg_expenses_insert
+        AFTER INSERT ON expenses
+        BEGIN
+            UPDATE expense_summary
+            SET total_cents = total_cents + NEW.amount_cents, count = count + 1
+            WHERE id = 1;
+
+            INSERT INTO category_totals (category_id, total_cents, count)
+            VALUES (IFNULL(NEW.category_id, 0), NEW.amount_cents, 1)
+            ON CONFLICT (category_id) DO UPDATE
+            SET total_cents = total_cents + excluded.total_cents, count = count + 1;
+
+            INSERT INTO period_totals (period, category_id, total_cents, count)
+            VALUES ({new_period}, IFNULL(NEW.category_id, 0), NEW.amount_cents, 1)
+            ON CONFLICT (period, category_id) DO UPDATE
+            SET total_cents = total_cents + excluded.total_cents, count = count + 1;
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER trg_expenses_delete
+        AFTER DELETE ON expenses
+        BEGIN
+            UPDATE expense_summary
+            SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+            WHERE id = 1;
+
+            UPDATE category_totals
+            SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+            WHERE category_id = IFNULL(OLD.category_id, 0);
+
+            UPDATE period_totals
+            SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+            WHERE period = {old_period} AND category_id = IFNULL(OLD.category_id, 0);
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER trg_expenses_update
+        AFTER UPDATE OF amount_cents, category_id, ts ON expenses
+        BEGIN
+            UPDATE expense_summary
+            SET total_cents = total_cents - OLD.amount_cents + NEW.amount_cents
+            WHERE id = 1;
+
+            UPDATE category_totals
+            SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+            WHERE category_id = IFNULL(OLD.category_id, 0);
+
+            INSERT INTO category_totals (category_id, total_cents, count)
+            VALUES (IFNULL(NEW.category_id, 0), NEW.amount_cents, 1)
+            ON CONFLICT (category_id) DO UPDATE
+            SET total_cents = total_cents + excluded.total_cents, count = count + 1;
+
+            UPDATE period_totals
+            SET total_cents = total_cents - OLD.amount_cents, count = count - 1
+            WHERE period = {old_period} AND category_id = IFNULL(OLD.category_id, 0);
+
+            INSERT INTO period_totals (period, category_id, total_cents, count)
+            VALUES ({new_period}, IFNULL(NEW.category_id, 0), NEW.amount_cents, 1)
+            ON CONFLICT (period, category_id) DO UPDATE
+            SET total_cents = total_cents + excluded.total_cents, count = count + 1;
+        END
+    """)
+
+
+def _migration_7(cur):
+    """Change counters, so cached copies of small tables can tell they are stale."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cur.execute("INSERT OR IGNORE INTO counters (name, value) VALUES ('categories', 0)")
+
+    # Any process that changes categories bumps the counter in the same
+    # transaction; the category registry compares it with what it loaded.
+    for event in ("INSERT", "DELETE", "UPDATE"):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_categories_{event.lower()}
+            AFTER {event} ON categories
+            BEGIN
+                UPDATE counters SET value = value + 1 WHERE name = 'categories';
+            END
+        """)
+
+
+def _migration_8(cur):
+    """Optional description (merchant, note) on expenses, full-text indexed."""
+    cur.execute("ALTER TABLE expenses ADD COLUMN description TEXT")
+
+    # External-content FTS5 table: the text lives in expenses only, the
+    # index holds tokens (plus 2- and 3-character prefixes for type-ahead).
+    # Only non-NULL descriptions are indexed.
+    cur.execute("""
+        CREATE VIRTUAL TABLE expenses_fts USING fts5(
+            description,
+            content = 'expenses',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+
+    cur.execute("""
+        CREATE TRIGGER trg_expenses_fts_insert
+        AFTER INSERT ON expenses
+        WHEN NEW.description IS NOT NULL
+        BEGIN
+            INSERT INTO expenses_fts (rowid, description)
+            VALUES (NEW.id, NEW.description);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER trg_expenses_fts_delete
+        AFTER DELETE ON expenses
+        WHEN OLD.description IS NOT NULL
+        BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description)
+            VALUES ('delete', OLD.id, OLD.description);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER trg_expenses_fts_update
+        AFTER UPDATE OF description ON expenses
+        BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description)
+            SELECT 'delete', OLD.id, OLD.description
+            WHERE OLD.description IS NOT NULL;
+
+            INSERT INTO expenses_fts (rowid, description)
+            SELECT NEW.id, NEW.description
+            WHERE NEW.description IS NOT NULL;
+        END
+    """)
+
+
+def _migration_9(cur):
+    """Recurring-expense rules and the occurrences already confirmed or skipped."""
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS recurring (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount_cents INTEGER NOT NULL,
+            category_id INTEGER,
+            description TEXT,
+            frequency TEXT NOT NULL CHECK (frequency IN ('weekly', 'monthly', 'yearly')),
+            interval INTEGER NOT NULL DEFAULT 1 CHECK (interval >= 1),
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER,
+            FOREIGN KEY (category_id) REFERENCES categories(id)
+        )
+    """)
+    # One row per occurrence that is no longer pending: expense_id is the
+    # expense it became, NULL when it was skipped.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS recurring_done (
+            rule_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            expense_id INTEGER,
+            PRIMARY KEY (rule_id, ts)
+        ) WITHOUT ROWID
+    """)
+
+
+def _migration_10(cur):
+    """Per-year archive files holding closed years moved out of expenses."""
+    # A row is written (ready = 0) before its rows are copied out, and
+    # marked ready in the transaction that deletes them from expenses, so
+    # readers only ever see a year in one place.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS archives (
+            year INTEGER PRIMARY KEY,
+            file TEXT NOT NULL,
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            ready INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    # Archived years are closed: nothing may be added to (or moved into)
+    # them, from this process or any other.
+    for event in ("INSERT", "UPDATE OF ts"):
+        cur.execute(f"""
+            CREATE TRIGGER trg_expenses_archived_{event.split()[0].lower()}
+            BEFORE {event} ON expenses
+            WHEN NEW.ts < (SELECT MAX(end_ts) FROM archives)
+            BEGIN
+                SELECT RAISE(ABORT, 'expense date falls in an archived year');
+            END
+        """)
+
+
+def _migration_11(cur):
+    """Import fingerprints, so importing the same statement twice adds nothing."""
+    cur.execute("ALTER TABLE expenses ADD COLUMN fingerprint INTEGER")
+
+    # Existing rows get the fingerprint an import of them would have had,
+    # as rows added from now on do (see add_expense), so statements
+    # imported before this version are recognised too. The ordinal
+    # numbers identical rows in id order, as an import numbers them in
+    # file order.
+    rows = cur.connection.execute("""
+        SELECT expenses.id, expenses.ts, expenses.amount_cents, IFNULL(categories.name, ''),
+               ROW_NUMBER() OVER (
+                   PARTITION BY expenses.ts, expenses.amount_cents, IFNULL(categories.name, '')
+                   ORDER BY expenses.id
+               )
+        FROM expenses
+        LEFT JOIN categories ON expenses.category_id = categories.id
+    """)
+    while chunk := rows.fetchmany(IMPORT_BATCH_SIZE):
+        cur.executemany("UPDATE expenses SET fingerprint = ? WHERE id = ?", [
+            (import_fingerprint(ts, cents, name, "", ordinal), exp_id)
+            for exp_id, ts, cents, name, ordinal in chunk
+        ])
+
+    # Partial: rows written by other tools (bench_data, scripts) may have none.
+    cur.execute("""
+        CREATE UNIQUE INDEX idx_expenses_fingerprint
+        ON expenses (fingerprint) WHERE fingerprint IS NOT NULL
+    """)
+
+
+def _migration_12(cur):
+    """Date order within a category, so category-filtered pages seek instead of sorting."""
+    cur.execute("""
+        CREATE INDEX idx_expenses_category_date
+        ON expenses (category_id, ts, id)
+    """)
+
+
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+    _migration_6,
+    _migration_7,
+    _migration_8,
+    _migration_9,
+    _migration_10,
+    _migration_11,
+    _migration_12,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version():
+    return connect().execute("PRAGMA user_version").fetchone()[0]
+
+
+@profiled("db.migrate")
+def migrate():
+    """Upgrade the database to SCHEMA_VERSION. Returns the list of versions applied."""
+    if get_schema_version() >= SCHEMA_VERSION:
+        return []
+
+    applied = []
+    with transaction() as cur:
+        # Re-read under the write lock: another process may have upgraded
+        # the file while we were waiting.
+        version = cur.execute("PRAGMA user_version").fetchone()[0]
+
+        for step in MIGRATIONS[version:]:
+            step(cur)
+            version += 1
+            cur.execute(f"PRAGMA user_version={version}")
+            applied.append(version)
+
+    if applied:
+        connect().execute("PRAGMA optimize")
+    return applied
+
+
+def create_tables():
+    migrate()
+
+
+# -----------------------------
+# QUERY PLANS
+# -----------------------------
+# SQL for the queries that run on every refresh. query_plans() reports
+# how SQLite executes them so a plan change (a dropped index, a new
+# temp B-tree sort) shows up as a diff instead of a slow dashboard.
+# {table} is "expenses", or an archive's table (see ARCHIVES).
+_GET_EXPENSES_SQL = """
+    SELECT expenses.id, expenses.amount_cents, categories.name, expenses.ts
+    FROM {table} AS expenses
+    LEFT JOIN categories ON expenses.category_id = categories.id
+    ORDER BY expenses.ts DESC
+"""
+GET_EXPENSES_SQL = _GET_EXPENSES_SQL.format(table="expenses")
+
+# Grouped by name so expenses whose category was deleted (and any
+# uncategorized ones) collapse into a single NULL-named slice.
+CATEGORY_TOTALS_SQL = """
+    SELECT categories.name, SUM(category_totals.total_cents) AS total
+    FROM category_totals
+    LEFT JOIN categories ON category_totals.category_id = categories.id
+    WHERE category_totals.count > 0
+    GROUP BY categories.name
+    ORDER BY total DESC
+"""
+
+# Columnar read for budget_analytics: only the three numeric columns, in
+# date order, so it is answered from idx_expenses_date without touching
+# the table.
+_EXPENSE_COLUMNS_SQL = """
+    SELECT amount_cents, IFNULL(category_id, 0), ts
+    FROM {table}
+    WHERE ts >= ? AND ts < ?
+    ORDER BY ts
+"""
+EXPENSE_COLUMNS_SQL = _EXPENSE_COLUMNS_SQL.format(table="expenses")
+
+# Open-ended bounds for timestamp ranges.
+MIN_TS = -(2 ** 63)
+MAX_TS = 2 ** 63 - 1
+
+# The Expense Manager's next page with a category filter, newest first,
+# as query_expenses() builds it (the "category" sort reads each category
+# the same way): idx_expenses_category_date seeks to the cursor, so no
+# page sorts the whole category.
+CATEGORY_PAGE_SQL = """
+    SELECT expenses.id, expenses.amount_cents, categories.name, expenses.ts,
+           expenses.description
+    FROM main.expenses AS expenses
+    LEFT JOIN categories ON expenses.category_id = categories.id
+    WHERE expenses.category_id IN (?) AND (expenses.ts, expenses.id) < (?, ?)
+    ORDER BY expenses.ts DESC, expenses.id DESC
+    LIMIT ?
+"""
+
+HOT_QUERIES = {
+    "get_expenses": (GET_EXPENSES_SQL, ()),
+    "category_totals": (CATEGORY_TOTALS_SQL, ()),
+    "expense_columns": (EXPENSE_COLUMNS_SQL, (MIN_TS, MAX_TS)),
+    "category_page": (CATEGORY_PAGE_SQL, (1, MAX_TS, 0, 100)),
+}
+
+
+def explain(sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement."""
+    cur = connect().execute("EXPLAIN QUERY PLAN " + sql, params)
+    return [row[3] for row in cur.fetchall()]
+
+
+def query_plans():
+    """Map each hot query name to its current query plan."""
+    return {name: explain(sql, params) for name, (sql, params) in HOT_QUERIES.items()}
 
 
 # -----------------------------
 # BUDGET FUNCTIONS
 # -----------------------------
-def get_budget():
-    conn = connect()
-    cur = conn.cursor()
+def current_period():
+    return datetime.now().strftime("%Y-%m")
 
-    cur.execute("SELECT income, savings, cash FROM budget LIMIT 1")
-    row = cur.fetchone()
 
-    conn.close()
+@profiled("db.get_budget")
+def get_budget(period=None):
+    """
+    (income, savings, cash) in cents for a "YYYY-MM" period (default: this
+    month). A month without its own row uses the latest earlier budget.
+    """
+    row = connect().execute("""
+        SELECT income_cents, savings_cents, cash_cents FROM budgets
+        WHERE period <= ?
+        ORDER BY period DESC
+        LIMIT 1
+    """, (period or current_period(),)).fetchone()
     return row
 
 
-def update_budget(income, savings, cash):
-    conn = connect()
-    cur = conn.cursor()
+@profiled("db.update_budget")
+def update_budget(income, savings, cash, period=None):
+    """Set the budget, in cents, for a period (default: this month)."""
+    with transaction() as cur:
+        cur.execute("""
+            INSERT INTO budgets (period, income_cents, savings_cents, cash_cents)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (period) DO UPDATE
+            SET income_cents = excluded.income_cents,
+                savings_cents = excluded.savings_cents,
+                cash_cents = excluded.cash_cents
+        """, (period or current_period(), income, savings, cash))
+
+
+# -----------------------------
+# CATEGORY REGISTRY
+# -----------------------------
+# Categories change rarely but are looked up on every add, import row and
+# dropdown fill, so one process-wide snapshot holds name -> id and
+# id -> name dicts. While the data revision is unchanged the snapshot is
+# used as is, with no query. After any write it re-reads the categories
+# change counter (one row) and only reloads the table when that moved.
+# add_category()/delete_category() drop the snapshot outright. Writes by
+# other processes are noticed once get_revision() sees them.
+CategoryRegistry = namedtuple("CategoryRegistry", "revision version ids names rows")
+
+_registry = None
+_registry_lock = threading.Lock()
 
-    cur.execute("UPDATE budget SET income=?, savings=?, cash=? WHERE id=1",
-                (income, savings, cash))
 
-    conn.commit()
-    conn.close()
+def category_registry():
+    """The current CategoryRegistry: ids maps name -> id, names id -> name,
+    rows is [(id, name)] sorted by name."""
+    global _registry
+    registry = _registry
+    revision = _revision
+    if registry is not None and registry.revision == revision:
+        return registry
+
+    with _registry_lock:
+        conn = connect()
+        version = conn.execute(
+            "SELECT value FROM counters WHERE name = 'categories'").fetchone()[0]
+        registry = _registry
+        if registry is not None and registry.version == version:
+            registry = registry._replace(revision=revision)
+        else:
+            rows = conn.execute("SELECT id, name FROM categories ORDER BY name ASC").fetchall()
+            registry = CategoryRegistry(
+                revision, version,
+                {name: cat_id for cat_id, name in rows},
+                {cat_id: name for cat_id, name in rows},
+                rows,
+            )
+        _registry = registry
+    return registry
+
+
+def invalidate_categories():
+    global _registry
+    _registry = None
+
+
+def category_id(name):
+    """Id of the category called name, or None."""
+    return category_registry().ids.get(name)
+
+
+def category_name(cat_id):
+    """Name of category cat_id, or None (deleted or uncategorized)."""
+    return category_registry().names.get(cat_id)
 
 
 # -----------------------------
 # CATEGORY FUNCTIONS
 # -----------------------------
+@profiled("db.get_categories")
 def get_categories():
-    conn = connect()
-    cur = conn.cursor()
-
-    cur.execute("SELECT id, name FROM categories ORDER BY name ASC")
-    rows = cur.fetchall()
-
-    conn.close()
-    return rows
+    """[(id, name)] sorted by name, from the category registry."""
+    return list(category_registry().rows)
 
 
+@profiled("db.add_category")
 def add_category(name):
-    conn = connect()
-    cur = conn.cursor()
-
     try:
-        cur.execute("INSERT INTO categories (name) VALUES (?)", (name,))
-        conn.commit()
+        with transaction() as cur:
+            cur.execute("INSERT INTO categories (name) VALUES (?)", (name,))
     except sqlite3.IntegrityError:
         pass  # category already exists
-
-    conn.close()
+    finally:
+        invalidate_categories()
 
 
+@profiled("db.delete_category")
 def delete_category(cat_id):
-    conn = connect()
-    cur = conn.cursor()
+    try:
+        with transaction() as cur:
+            cur.execute("DELETE FROM categories WHERE id=?", (cat_id,))
+    finally:
+        invalidate_categories()
+
+
+# -----------------------------
+# EXPENSE FUNCTIONS
+# -----------------------------
+# Expense rows are (id, amount in cents, category name, epoch seconds,
+# description) everywhere; budget_units formats them for display.
+_EXPENSE_ROW_SQL = """
+    SELECT expenses.id, expenses.amount_cents, categories.name, expenses.ts,
+           expenses.description
+    FROM expenses
+    LEFT JOIN categories ON expenses.category_id = categories.id
+    WHERE expenses.id = ?
+"""
+
+
+@profiled("db.add_expense")
+def add_expense(amount, category_id, ts=None, description=None):
+    """Insert an expense of amount cents (at ts, default now) and return its row."""
+    ts = now_timestamp() if ts is None else ts
+    with transaction() as cur:
+        cur.execute("""
+            INSERT INTO expenses (amount_cents, category_id, ts, description, fingerprint)
+            VALUES (?, ?, ?, ?, ?)
+        """, (amount, category_id, ts, _clean_description(description),
+              _expense_fingerprint(cur, ts, amount, category_id)))
+        return cur.execute(_EXPENSE_ROW_SQL, (cur.lastrowid,)).fetchone()
+
+
+def _expense_fingerprint(cur, ts, cents, category_id):
+    """
+    The fingerprint a CSV import of this expense would carry (see IMPORT
+    CSV): the first ordinal no identical expense has taken yet.
+    """
+    row = cur.execute("SELECT name FROM categories WHERE id = ?", (category_id,)).fetchone()
+    name = row[0] if row else ""
+    ordinal = 1
+    while True:
+        fingerprint = import_fingerprint(ts, cents, name, "", ordinal)
+        if not cur.execute("SELECT 1 FROM expenses WHERE fingerprint = ?",
+                           (fingerprint,)).fetchone():
+            return fingerprint
+        ordinal += 1
+
+
+def _clean_description(text):
+    """Descriptions are stored stripped, and blank ones as NULL (not indexed)."""
+    text = (text or "").strip()
+    return text or None
+
+
+@profiled("db.get_expenses")
+def get_expenses():
+    """
+    Every expense, archived years included, newest first. Prefer
+    query_expenses() for anything large.
+    """
+    rows = connect().execute(GET_EXPENSES_SQL).fetchall()
+    for year, file, _, _ in reversed(_segments(hot=False)):
+        table = f"{_schema(year, file)}.expenses"
+        rows += connect().execute(_GET_EXPENSES_SQL.format(table=table)).fetchall()
+    return rows
+
 
-    cur.execute("DELETE FROM categories WHERE id=?", (cat_id,))
-    conn.commit()
+@profiled("db.delete_expense")
+def delete_expense(exp_id):
+    """
+    Delete an expense and return the removed row, or None if it was already
+    gone. Archived expenses are read-only: deleting one raises ValueError.
+    """
+    # Only take the write lock for a row that is there to delete.
+    if connect().execute("SELECT 1 FROM expenses WHERE id=?", (exp_id,)).fetchone() is None:
+        if _archived_year(exp_id) is not None:
+            raise ValueError(f"expense {exp_id} is in an archived year and cannot be deleted")
+        return None
 
-    conn.close()
+    with transaction() as cur:
+        row = cur.execute(_EXPENSE_ROW_SQL, (exp_id,)).fetchone()
+        cur.execute("DELETE FROM expenses WHERE id=?", (exp_id,))
+    return row
 
 
 # -----------------------------
-# EXPENSE FUNCTIONS
+# RECURRING EXPENSES
 # -----------------------------
-def add_expense(amount, category_id):
-    conn = connect()
-    cur = conn.cursor()
+# Rent, utilities and subscriptions are stored once as a rule. Nothing is
+# generated ahead of time: budget_logic expands a rule into occurrences
+# for whatever window is being looked at, and an occurrence only becomes
+# an expenses row when it is confirmed. recurring_done remembers the
+# occurrences that are no longer pending (confirmed or skipped).
+RecurringRule = namedtuple(
+    "RecurringRule",
+    "id amount category_id category description frequency interval start end",
+)
+FREQUENCIES = ("weekly", "monthly", "yearly")
+
+
+@profiled("db.add_recurring")
+def add_recurring(amount, category_id, frequency, start, interval=1, end=None,
+                  description=None):
+    """
+    Store a rule: amount cents every interval weeks/months/years from the
+    timestamp start, until end (exclusive, None for open-ended). Returns its id.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+    with transaction() as cur:
+        cur.execute("""
+            INSERT INTO recurring (amount_cents, category_id, description, frequency,
+                                   interval, start_ts, end_ts)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (amount, category_id, _clean_description(description), frequency,
+              interval, start, end))
+        return cur.lastrowid
 
+
+@profiled("db.get_recurring")
+def get_recurring(start=None, end=None):
+    """Rules with occurrences that may fall in [start, end) (either may be None), by id."""
+    cur = connect().cursor()
     cur.execute("""
-        INSERT INTO expenses (amount, category_id, date)
-        VALUES (?, ?, ?)
-    """, (amount, category_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        SELECT recurring.id, recurring.amount_cents, recurring.category_id, categories.name,
+               recurring.description, recurring.frequency, recurring.interval,
+               recurring.start_ts, recurring.end_ts
+        FROM recurring
+        LEFT JOIN categories ON recurring.category_id = categories.id
+        WHERE recurring.start_ts < ? AND IFNULL(recurring.end_ts, ?) > ?
+        ORDER BY recurring.id
+    """, (MAX_TS if end is None else end, MAX_TS, MIN_TS if start is None else start))
+    return [RecurringRule(*row) for row in cur.fetchall()]
 
-    conn.commit()
-    conn.close()
 
+@profiled("db.end_recurring")
+def end_recurring(rule_id, end=None):
+    """Stop a rule: no occurrences from end on (default now). Past ones are kept."""
+    with transaction() as cur:
+        cur.execute("UPDATE recurring SET end_ts = ? WHERE id = ?",
+                    (now_timestamp() if end is None else end, rule_id))
 
-def get_expenses():
-    conn = connect()
-    cur = conn.cursor()
 
+@profiled("db.get_recurring_done")
+def get_recurring_done(start=None, end=None):
+    """{(rule id, occurrence ts)} confirmed or skipped with start <= ts < end."""
+    cur = connect().cursor()
     cur.execute("""
-        SELECT expenses.id, expenses.amount, categories.name, expenses.date
-        FROM expenses
-        LEFT JOIN categories ON expenses.category_id = categories.id
-        ORDER BY expenses.date DESC
-    """)
+        SELECT rule_id, ts FROM recurring_done WHERE ts >= ? AND ts < ?
+    """, (MIN_TS if start is None else start, MAX_TS if end is None else end))
+    return set(cur.fetchall())
 
-    rows = cur.fetchall()
 
-    conn.close()
-    return rows
+@profiled("db.confirm_recurring")
+def confirm_recurring(rule_id, ts):
+    """
+    Turn one occurrence into an expenses row (at its scheduled time).
+    Returns the new expense row, or None if it was already confirmed or
+    skipped. Whether ts is an occurrence of the rule is budget_logic's check.
+    """
+    with transaction() as cur:
+        rule = cur.execute("""
+            SELECT amount_cents, category_id, description FROM recurring WHERE id = ?
+        """, (rule_id,)).fetchone()
+        if rule is None:
+            raise LookupError(f"recurring rule {rule_id} not found")
+        cur.execute("INSERT OR IGNORE INTO recurring_done (rule_id, ts) VALUES (?, ?)",
+                    (rule_id, ts))
+        if not cur.rowcount:
+            return None
 
+        row = add_expense(rule[0], rule[1], ts, rule[2])
+        cur.execute("UPDATE recurring_done SET expense_id = ? WHERE rule_id = ? AND ts = ?",
+                    (row[0], rule_id, ts))
+        return row
 
-def delete_expense(exp_id):
+
+@profiled("db.skip_recurring")
+def skip_recurring(rule_id, ts):
+    """Drop one occurrence without recording an expense."""
+    with transaction() as cur:
+        cur.execute("INSERT OR IGNORE INTO recurring_done (rule_id, ts) VALUES (?, ?)",
+                    (rule_id, ts))
+
+
+# -----------------------------
+# ARCHIVES
+# -----------------------------
+# Closed years can be moved out of expenses into one file per year beside
+# the database ("budget-2023.db" next to "budget.db"), so the hot file,
+# its indexes and its search index only hold recent history. The rollups
+# (expense_summary, category_totals, period_totals) keep counting
+# archived expenses, so the dashboard, budgets and per-period totals
+# never open an archive.
+#
+# Listings, sums and exports attach an archive to the thread's connection
+# only when their date range (or, for date-ordered pages, the page
+# cursor) reaches it. Date-ordered reads walk the hot table and then each
+# archive in turn; other orders read one logical table, the temporary
+# expenses_all view, a UNION ALL over the hot table and the archives the
+# query reaches. Archived expenses are read-only.
+ARCHIVE_ATTACH_LIMIT = 9  # SQLite attaches at most 10 databases per connection
+ARCHIVE_VERSION = 2  # 2: expenses carry import fingerprints
+EXPENSE_COLUMNS = "id, amount_cents, category_id, ts, description"
+
+
+def archive_path(year):
+    """The archive file for year, beside DB_NAME."""
+    base, ext = os.path.splitext(DB_NAME)
+    return f"{base}-{year}{ext or '.db'}"
+
+
+def _archive_file(name):
+    return os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), name)
+
+
+def _year_bounds(year):
+    return to_timestamp(f"{year:04d}-01-01"), to_timestamp(f"{year + 1:04d}-01-01")
+
+
+@profiled("db.get_archives")
+def get_archives():
+    """(year, count, total cents) of every archived year, oldest first."""
+    cur = connect().execute(
+        "SELECT year, count, total_cents FROM archives WHERE ready ORDER BY year")
+    return cur.fetchall()
+
+
+@profiled("db.archive_floor")
+def archive_floor():
+    """Expenses dated before this timestamp belong to archived years (MIN_TS if none)."""
+    row = connect().execute("SELECT MAX(end_ts) FROM archives").fetchone()
+    return MIN_TS if row[0] is None else row[0]
+
+
+def _segments(start=None, end=None, hot=True):
+    """
+    Where the expenses with start <= ts < end live, oldest first: (year,
+    file, first ts, end ts) per archive, then (unless hot is False)
+    (None, None, ...) for the hot table, which holds everything after the
+    last archived year.
+    """
+    archives = connect().execute(
+        "SELECT year, file, start_ts, end_ts FROM archives WHERE ready ORDER BY year"
+    ).fetchall()
+    segments = [seg for seg in archives
+                if (start is None or seg[3] > start) and (end is None or seg[2] < end)]
+    if hot:
+        segments.append((None, None, archives[-1][3] if archives else MIN_TS, MAX_TS))
+    return segments
+
+
+def _schema(year, file):
+    """The schema name of a _segments() entry, attaching it if it is an archive."""
+    return "main" if year is None else _attach(year, file)
+
+
+def _attach(year, file, create=False):
+    """
+    Attach an archive to this thread's connection (if it is not already)
+    and return its schema name. The least recently used archive is
+    detached to stay under ARCHIVE_ATTACH_LIMIT.
+    """
+    conn = connect()
+    schema = f"archive_{year}"
+    attached = _local.attached
+    if schema in attached:
+        if not create:
+            attached[schema] = attached.pop(schema)  # now most recently used
+            return schema
+        _detach(schema)
+
+    path = _archive_file(file)
+    if create:
+        _remove(path)  # left by an interrupted run; never registered as ready
+    elif not os.path.exists(path):
+        raise FileNotFoundError(f"the archive for {year} is missing: {path}")
+
+    while len(attached) >= ARCHIVE_ATTACH_LIMIT:
+        _detach(next(iter(attached)))
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+    attached[schema] = path
+    return schema
+
+
+def _detach(schema):
     conn = connect()
-    cur = conn.cursor()
+    if _local.view is not None and schema in _local.view:
+        conn.execute("DROP VIEW IF EXISTS temp.expenses_all")
+        _local.view = None
+    conn.execute(f"DETACH DATABASE {schema}")
+    del _local.attached[schema]
+
+
+def _expenses_view(schemas):
+    """Point the temporary expenses_all view at the expenses of schemas; returns its name."""
+    schemas = tuple(schemas)
+    if _local.view != schemas:
+        conn = connect()
+        conn.execute("DROP VIEW IF EXISTS temp.expenses_all")
+        conn.execute("CREATE TEMP VIEW expenses_all AS " + " UNION ALL ".join(
+            f"SELECT {EXPENSE_COLUMNS} FROM {schema}.expenses" for schema in schemas))
+        _local.view = schemas
+    return "expenses_all"
+
+
+def _archived_year(exp_id):
+    """The archived year holding expense exp_id, or None."""
+    for year, file, _, _ in _segments(hot=False):
+        schema = _schema(year, file)
+        if connect().execute(f"SELECT 1 FROM {schema}.expenses WHERE id = ?",
+                             (exp_id,)).fetchone():
+            return year
+    return None
+
 
-    cur.execute("DELETE FROM expenses WHERE id=?", (exp_id,))
-    conn.commit()
+@profiled("db.archive_years")
+def archive_years(through, vacuum=True, progress=None):
+    """
+    Move the expenses of every year up to and including through into
+    per-year archive files (see archive_path()), oldest first. Only years
+    before the current one can be archived; an archived year takes no new
+    expenses.
 
-    conn.close()
+    Each year is copied, checked against the hot table and only then
+    deleted from it, so an interrupted run loses nothing and the next run
+    finishes it. vacuum then compacts the hot file. progress, if given, is
+    called as progress(stage, done, total) with stage "archive" (years) or
+    "vacuum"; returning False stops before the next year.
+
+    Returns the list of years archived.
+    """
+    if through >= datetime.now().year:
+        raise ValueError("only years before the current one can be archived")
+
+    conn = connect()
+    pending = {year for (year,) in conn.execute("SELECT year FROM archives WHERE NOT ready")}
+    archived = {year for (year,) in conn.execute("SELECT year FROM archives WHERE ready")}
+    periods = conn.execute(
+        "SELECT DISTINCT period FROM period_totals WHERE count > 0 AND period < ?",
+        (f"{through + 1:04d}-01",),
+    ).fetchall()
+    years = sorted(({int(period[:4]) for (period,) in periods} | pending) - archived)
+
+    done = []
+    for index, year in enumerate(years):
+        if progress is not None and progress("archive", index, len(years)) is False:
+            break
+        _archive_year(year)
+        done.append(year)
+
+    if done and vacuum:
+        if progress is not None:
+            progress("vacuum", 0, 1)
+        with transaction() as cur:
+            cur.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('optimize')")
+        conn.execute("VACUUM main")
+    return done
+
+
+def _archive_year(year):
+    start, end = _year_bounds(year)
+    name = os.path.basename(archive_path(year))
+
+    # Close the year first, so nothing new lands in it while it is copied.
+    with transaction() as cur:
+        cur.execute("""
+            INSERT INTO archives (year, file, start_ts, end_ts) VALUES (?, ?, ?, ?)
+            ON CONFLICT (year) DO UPDATE SET file = excluded.file
+        """, (year, name, start, end))
+
+    # A commit spanning two files is not atomic with WAL, so the copy
+    # commits on its own and the hot rows go in a second transaction, once
+    # the copy is known to match them. A year edited in between is copied
+    # again.
+    while True:
+        schema = _copy_year(year, name, start, end)
+        with transaction() as cur:
+            checksum = "SELECT COUNT(*), IFNULL(SUM(amount_cents), 0), IFNULL(SUM(id), 0) FROM {}"
+            hot = cur.execute(checksum.format("main.expenses WHERE ts >= ? AND ts < ?"),
+                              (start, end)).fetchone()
+            if cur.execute(checksum.format(f"{schema}.expenses")).fetchone() != hot:
+                continue
+
+            # The rollups keep counting archived expenses; only the search
+            # index forgets them (trg_expenses_fts_delete).
+            with _suspended_triggers(cur, ("trg_expenses_delete",)):
+                cur.execute("DELETE FROM main.expenses WHERE ts >= ? AND ts < ?", (start, end))
+            cur.execute("UPDATE archives SET ready = 1, count = ?, total_cents = ? WHERE year = ?",
+                        (hot[0], hot[1], year))
+        return
+
+
+def _copy_year(year, name, start, end):
+    """Write a fresh archive file holding year's expenses; returns its schema name."""
+    schema = _attach(year, name, create=True)
+    conn = connect()
+    # One self-contained file, on disk before the hot rows are deleted.
+    conn.execute(f"PRAGMA {schema}.journal_mode=DELETE")
+    conn.execute(f"PRAGMA {schema}.synchronous=FULL")
+    with transaction() as cur:
+        cur.execute(f"""
+            CREATE TABLE {schema}.expenses (
+                id INTEGER PRIMARY KEY,
+                amount_cents INTEGER NOT NULL,
+                category_id INTEGER,
+                ts INTEGER NOT NULL,
+                description TEXT,
+                fingerprint INTEGER
+            )
+        """)
+        cur.execute(f"""
+            INSERT INTO {schema}.expenses ({EXPENSE_COLUMNS}, fingerprint)
+            SELECT {EXPENSE_COLUMNS}, fingerprint FROM main.expenses
+            WHERE ts >= ? AND ts < ?
+            ORDER BY id
+        """, (start, end))
+
+        # The hot table's indexes and search index, built once over the copy.
+        cur.execute(f"""
+            CREATE INDEX {schema}.idx_expenses_date
+            ON expenses (ts, id, amount_cents, category_id)
+        """)
+        cur.execute(f"""
+            CREATE INDEX {schema}.idx_expenses_category
+            ON expenses (category_id, amount_cents)
+        """)
+        cur.execute(f"""
+            CREATE INDEX {schema}.idx_expenses_amount
+            ON expenses (amount_cents, id)
+        """)
+        cur.execute(f"""
+            CREATE INDEX {schema}.idx_expenses_category_date
+            ON expenses (category_id, ts, id)
+        """)
+        cur.execute(f"""
+            CREATE UNIQUE INDEX {schema}.idx_expenses_fingerprint
+            ON expenses (fingerprint) WHERE fingerprint IS NOT NULL
+        """)
+        cur.execute(f"""
+            CREATE VIRTUAL TABLE {schema}.expenses_fts USING fts5(
+                description,
+                content = 'expenses',
+                content_rowid = 'id',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+        cur.execute(f"INSERT INTO {schema}.expenses_fts (expenses_fts) VALUES ('rebuild')")
+        cur.execute(f"PRAGMA {schema}.user_version={ARCHIVE_VERSION}")
+    return schema
+
+
+# -----------------------------
+# EXPENSE QUERIES
+# -----------------------------
+# One query builder for every listing: filters, sort order, keyset
+# pagination and limits all become SQL, so callers only ever see the rows
+# they asked for. Keyset pagination starts strictly after (or before) the
+# sort key of a row already seen, so page N costs the same as page 1 and
+# no OFFSET scan is needed. The id is always the tiebreaker.
+EXPENSE_PAGE_SIZE = 100
+QUERY_CHUNK_SIZE = 2000
+
+# A search lists (and ranks) at most this many matches, the most recently
+# added first. Ranking costs time per candidate, so this keeps type-ahead
+# fast however common the prefix is; sum_expenses() still counts them all.
+SEARCH_LIMIT = 2000
+
+EXPENSE_SORT_KEYS = {
+    "id": ("expenses.id",),
+    "date": ("expenses.ts", "expenses.id"),
+    "amount": ("expenses.amount_cents", "expenses.id"),
+    "category": ("IFNULL(categories.name, '')", "expenses.ts", "expenses.id"),
+    # Only with a search: best bm25 match first (lower rank is better).
+    "relevance": ("expenses.rank", "expenses.id"),
+}
+
+
+def expense_sort_key(row, sort="date"):
+    """The keyset cursor for an expense row. Search results carry their
+    rank as a sixth column, which the "relevance" sort uses."""
+    exp_id, amount, category, date = row[:4]
+    if sort == "relevance":
+        return (row[5], exp_id)
+    return {
+        "id": (exp_id,),
+        "date": (date, exp_id),
+        "amount": (amount, exp_id),
+        "category": (category or "", date, exp_id),
+    }[sort]
+
+
+def fts_query(text):
+    """
+    Turn what the user typed into an FTS5 query: every word must match as
+    a prefix ("amaz mar" finds "Amazon Marketplace"). Returns "" when there
+    is nothing to search for.
+    """
+    words = "".join(ch if ch.isalnum() else " " for ch in text).split()
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _expense_filters(start=None, end=None, category_ids=None,
+                     min_amount=None, max_amount=None, search=None, schema="main"):
+    """WHERE terms and params shared by listings and sums (over schema's expenses)."""
+    where, params = [], []
+    match = fts_query(search) if search else ""
+    if match:
+        where.append(f"expenses.id IN (SELECT rowid FROM {schema}.expenses_fts "
+                     "WHERE expenses_fts MATCH ?)")
+        params.append(match)
+    if start is not None:
+        where.append("expenses.ts >= ?")
+        params.append(start)
+    if end is not None:
+        where.append("expenses.ts < ?")
+        params.append(end)
+    if category_ids is not None:
+        category_ids = list(category_ids)
+        where.append(f"expenses.category_id IN ({','.join('?' * len(category_ids))})")
+        params.extend(category_ids)
+    if min_amount is not None:
+        where.append("expenses.amount_cents >= ?")
+        params.append(min_amount)
+    if max_amount is not None:
+        where.append("expenses.amount_cents <= ?")
+        params.append(max_amount)
+    return where, params
+
+
+def _expense_source(schemas, match="", cutoff=None):
+    """
+    FROM-clause source for the expenses in schemas, named "expenses". With
+    a search (an fts_query() string) it holds only the matching rows with
+    ids from cutoff on, each with its bm25 rank as expenses.rank. Returns
+    (sql, params).
+    """
+    if match:
+        # The cutoff goes on the FTS rowid, where the index can use it.
+        arm = """
+            SELECT expenses.id, expenses.amount_cents, expenses.category_id, expenses.ts,
+                   expenses.description, expenses_fts.rank AS rank
+            FROM {schema}.expenses_fts AS expenses_fts
+            JOIN {schema}.expenses AS expenses ON expenses.id = expenses_fts.rowid
+            WHERE expenses_fts MATCH ? AND expenses_fts.rowid >= ?
+        """
+        arms = [arm.format(schema=schema) for schema in schemas]
+        params = [match, MIN_TS if cutoff is None else cutoff] * len(arms)
+        return f"({' UNION ALL '.join(arms)}) AS expenses", params
+    if len(schemas) == 1:
+        return f"{schemas[0]}.expenses AS expenses", []
+    return f"{_expenses_view(schemas)} AS expenses", []
+
+
+def _category_groups(category_ids=None):
+    """
+    [(name, ids)] for the "category" sort, by name: each category that
+    has expenses (restricted to category_ids), with uncategorized
+    expenses and those of deleted categories together under "" (id 0
+    standing for uncategorized). Read from category_totals, which counts
+    archived years too.
+    """
+    wanted = None if category_ids is None else set(category_ids)
+    groups = {}
+    for name, cat_id in connect().execute("""
+        SELECT IFNULL(categories.name, ''), category_totals.category_id
+        FROM category_totals
+        LEFT JOIN categories ON category_totals.category_id = categories.id
+        WHERE category_totals.count > 0
+    """):
+        if wanted is None or cat_id in wanted:
+            groups.setdefault(name, []).append(cat_id)
+    return sorted(groups.items())
+
+
+def _category_term(ids):
+    """WHERE term (and params) for expenses in category ids, 0 meaning uncategorized."""
+    params = [cat_id for cat_id in ids if cat_id]
+    terms = [f"expenses.category_id IN ({','.join('?' * len(params))})"] if params else []
+    if 0 in ids:
+        terms.append("expenses.category_id IS NULL")
+    return f"({' OR '.join(terms)})", params
+
+
+def _search_cutoff(segments, match, where, params):
+    """
+    Lowest id among the SEARCH_LIMIT newest expenses matching the search
+    and the other filters, or None when fewer match. The FTS index hands
+    out matches in id order, so each schema stops after SEARCH_LIMIT hits.
+    """
+    ids = []
+    for year, file, _, _ in segments:
+        schema = _schema(year, file)
+        sql = f"SELECT expenses_fts.rowid FROM {schema}.expenses_fts AS expenses_fts"
+        if where:
+            sql += f" JOIN {schema}.expenses AS expenses ON expenses.id = expenses_fts.rowid"
+        sql += " WHERE " + " AND ".join(["expenses_fts MATCH ?"] + where)
+        sql += " ORDER BY expenses_fts.rowid DESC LIMIT ?"
+        cur = connect().execute(sql, [match] + params + [SEARCH_LIMIT])
+        ids.extend(row[0] for row in cur.fetchall())
+    if len(ids) < SEARCH_LIMIT:
+        return None
+    return sorted(ids, reverse=True)[SEARCH_LIMIT - 1]
+
+
+def _drain(cur, chunk_size):
+    """Yield a cursor's rows, fetchmany chunk_size at a time, then close it."""
+    try:
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+
+def query_expenses(start=None, end=None, category_ids=None, min_amount=None, max_amount=None,
+                   search=None, sort="date", descending=True, after=None, before=None,
+                   limit=None, chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Lazily yield (id, amount, category, date, description) rows matching
+    the filters.
+
+    start/end bound the timestamp (start inclusive, end exclusive);
+    category_ids restricts to those ids; min_amount/max_amount are
+    inclusive, in cents. search matches descriptions word by word as
+    prefixes through the FTS index and yields at most the SEARCH_LIMIT
+    newest matches; its rows gain a sixth column, the bm25 rank. sort is
+    a key of EXPENSE_SORT_KEYS ("relevance" needs a search, and ascending
+    order puts the best match first).
+
+    after/before take a key from expense_sort_key(): after continues past
+    that row in display order, before yields the rows preceding it (still
+    in display order, so before needs a limit to stay bounded).
+
+    Archived years are included as the date range reaches them. Sorted by
+    date (without a search) the hot table and each archive are read in
+    turn, so a page only opens the archives it reaches. Sorted by category
+    (without a search) the categories are read one at a time, each in
+    date order. Other
+    orders read the expenses_all view, or, past ARCHIVE_ATTACH_LIMIT
+    archives, merge each file's sorted rows in memory.
+
+    The cursor is drained in fetchmany chunks, so memory stays flat
+    however many rows match.
+    """
+    columns = EXPENSE_SORT_KEYS[sort]
+    where, params = _expense_filters(start, end, category_ids, min_amount, max_amount)
+    match = fts_query(search) if search else ""
+    if sort == "relevance" and not match:
+        raise ValueError("sorting by relevance needs a search")
+
+    segments = _segments(start, end)
+    cutoff = _search_cutoff(segments, match, where, params) if match else None
+
+    backwards = before is not None
+    reverse = descending != backwards
+    direction = "DESC" if reverse else "ASC"
+
+    def keyset(cols, key):
+        marks = f"({', '.join('?' * len(cols))})"
+        return f"({', '.join(cols)}) {'<' if reverse else '>'} {marks}", list(key)
+
+    by_category = sort == "category" and not match
+    cursor = before if backwards else after
+    if cursor is not None and not by_category:
+        term, key = keyset(columns, cursor)
+        where.append(term)
+        params.extend(key)
+
+    def select(source, source_params, limit, order=columns, extra=(), extra_params=()):
+        sql = f"""
+            SELECT expenses.id, expenses.amount_cents, categories.name, expenses.ts,
+                   expenses.description{", expenses.rank" if match else ""}
+            FROM {source}
+            LEFT JOIN categories ON expenses.category_id = categories.id
+        """
+        terms = where + list(extra)
+        args = source_params + params + list(extra_params)
+        if terms:
+            sql += " WHERE " + " AND ".join(terms)
+        sql += " ORDER BY " + ", ".join(f"{col} {direction}" for col in order)
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return _drain(connect().execute(sql, args), chunk_size)
+
+    def walk():
+        # Newest segment first when reading backwards in time; segments
+        # wholly past the cursor are skipped without being attached.
+        remaining = limit
+        for year, file, first_ts, end_ts in (reversed(segments) if reverse else segments):
+            if cursor is not None and (first_ts > cursor[0] if reverse else end_ts <= cursor[0]):
+                continue
+            for row in select(f"{_schema(year, file)}.expenses AS expenses", [], remaining):
+                yield row
+                if remaining is not None:
+                    remaining -= 1
+            if remaining == 0:
+                return
+
+    def merge(limit, order, extra, extra_params):
+        # Too many archives to attach at once: sort each file's rows in
+        # SQL, one after the other, and merge them here.
+        parts = [list(select(*_expense_source([_schema(year, file)], match, cutoff), limit,
+                             order, extra, extra_params))
+                 for year, file, _, _ in segments]
+        rows = heapq.merge(*parts, key=lambda row: expense_sort_key(row, sort), reverse=reverse)
+        return islice(rows, limit)
+
+    def ordered(limit, order=columns, extra=(), extra_params=()):
+        if len(segments) - 1 > ARCHIVE_ATTACH_LIMIT:
+            return merge(limit, order, extra, extra_params)
+        # With a search, the query is driven from the FTS indexes so only
+        # matching rows are visited and each comes with its rank.
+        schemas = [_schema(year, file) for year, file, _, _ in segments]
+        return select(*_expense_source(schemas, match, cutoff), limit, order, extra, extra_params)
+
+    def walk_categories():
+        # No index orders by category name, so take the categories in
+        # name order and read each one in (ts, id) order, which
+        # idx_expenses_category_date serves; the cursor's own category
+        # resumes after its (ts, id).
+        remaining = limit
+        groups = _category_groups(category_ids)
+        for name, ids in (reversed(groups) if reverse else groups):
+            term, extra_params = _category_term(ids)
+            extra = [term]
+            if cursor is not None:
+                if name > cursor[0] if reverse else name < cursor[0]:
+                    continue
+                if name == cursor[0]:
+                    term, key = keyset(columns[1:], cursor[1:])
+                    extra.append(term)
+                    extra_params += key
+            for row in ordered(remaining, columns[1:], extra, extra_params):
+                yield row
+                if remaining is not None:
+                    remaining -= 1
+            if remaining == 0:
+                return
+
+    if sort == "date" and not match:
+        rows = walk()
+    elif by_category:
+        rows = walk_categories()
+    else:
+        rows = ordered(limit)
+    if backwards:
+        yield from reversed(list(rows))
+    else:
+        yield from rows
+
+
+@profiled("db.get_expense_page")
+def get_expense_page(sort="date", descending=True, after=None, before=None,
+                     limit=EXPENSE_PAGE_SIZE, **filters):
+    """One page of query_expenses() as a list, in display order."""
+    return list(query_expenses(sort=sort, descending=descending, after=after,
+                               before=before, limit=limit, **filters))
+
+
+def iter_expense_columns(start=None, end=None, chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Yield lists of (cents, category id, timestamp) rows with start <= ts < end
+    in date order, chunk_size at a time. Uncategorized expenses have
+    category id 0.
+    """
+    for year, file, _, _ in _segments(start, end):
+        table = f"{_schema(year, file)}.expenses"
+        cur = connect().execute(_EXPENSE_COLUMNS_SQL.format(table=table),
+                                (MIN_TS if start is None else start,
+                                 MAX_TS if end is None else end))
+        try:
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+
+@profiled("db.sum_expenses")
+def sum_expenses(**filters):
+    """
+    (count, total cents) of the expenses matching query_expenses()-style
+    filters, adding up each archived year the date range reaches.
+    """
+    count = total = 0
+    for year, file, _, _ in _segments(filters.get("start"), filters.get("end")):
+        schema = _schema(year, file)
+        where, params = _expense_filters(schema=schema, **filters)
+        sql = ("SELECT COUNT(*), IFNULL(SUM(expenses.amount_cents), 0) "
+               f"FROM {schema}.expenses AS expenses")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        rows, cents = connect().execute(sql, params).fetchone()
+        count += rows
+        total += cents
+    return count, total
+
+
+# -----------------------------
+# RUNNING TOTALS
+# -----------------------------
+@profiled("db.get_expense_total")
+def get_expense_total():
+    """Total cents of all expenses, read from the trigger-maintained summary row."""
+    row = connect().execute("SELECT total_cents FROM expense_summary WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+@profiled("db.get_category_totals")
+def get_category_totals():
+    """(category name, total cents) for every category that has expenses."""
+    cur = connect().execute(CATEGORY_TOTALS_SQL)
+    return cur.fetchall()
+
+
+@profiled("db.get_period_totals")
+def get_period_totals(period=None):
+    """(category name, total cents) for one "YYYY-MM" period, from the rollup table."""
+    cur = connect().execute("""
+        SELECT categories.name, SUM(period_totals.total_cents) AS total
+        FROM period_totals
+        LEFT JOIN categories ON period_totals.category_id = categories.id
+        WHERE period_totals.period = ? AND period_totals.count > 0
+        GROUP BY categories.name
+        ORDER BY total DESC
+    """, (period or current_period(),))
+    return cur.fetchall()
+
+
+@profiled("db.get_period_total")
+def get_period_total(period=None):
+    """Cents spent in one "YYYY-MM" period; reads one rollup row per category."""
+    row = connect().execute(
+        "SELECT IFNULL(SUM(total_cents), 0) FROM period_totals WHERE period = ?",
+        (period or current_period(),),
+    ).fetchone()
+    return row[0]
+
+
+def get_periods():
+    """Every period that has expenses or a budget, newest first."""
+    cur = connect().execute("""
+        SELECT period FROM period_totals WHERE count > 0
+        UNION
+        SELECT period FROM budgets WHERE period != ?
+        ORDER BY period DESC
+    """, (BASE_PERIOD,))
+    return [row[0] for row in cur.fetchall()]
 
 
 # -----------------------------
 # EXPORT CSV
 # -----------------------------
-def export_expenses_csv(path):
-    rows = get_expenses()
+@profiled("db.export_expenses_csv")
+def export_expenses_csv(path, compress=None, **filters):
+    """
+    Write expenses to CSV with flat memory use, however long the history.
+
+    compress=None gzips when path ends in ".gz". Filters (start, end,
+    category_ids, min_amount, max_amount) are passed to query_expenses().
+    Returns the number of rows written.
+    """
+    if compress is None:
+        compress = str(path).endswith(".gz")
+
+    if compress:
+        file = gzip.open(path, "wt", newline="", encoding="utf-8")
+    else:
+        file = open(path, "w", newline="", encoding="utf-8")
 
-    with open(path, "w", newline="", encoding="utf-8") as file:
+    count = 0
+    with file:
         writer = csv.writer(file)
-        writer.writerow(["ID", "Amount", "Category", "Date"])
-        writer.writerows(rows)
+        writer.writerow(["ID", "Amount", "Category", "Date", "Description"])
+        for exp_id, cents, category, ts, description, *_ in query_expenses(**filters):
+            writer.writerow([exp_id, format_amount(cents), category, format_timestamp(ts),
+                             description or ""])
+            count += 1
+
+    return count
 
 
 # -----------------------------
 # IMPORT CSV
 # -----------------------------
-def import_expenses_csv(path):
-    conn = connect()
-    cur = conn.cursor()
+# Imports are idempotent: every imported row carries a fingerprint of its
+# date, amount, category and the statement's own reference (an optional
+# Reference column), and a unique index on it turns rows already in the
+# database into ignored inserts. Identical rows within one file (two
+# coffees at the same price on the same day) are told apart by their
+# ordinal, so re-importing, or importing an overlapping statement, adds
+# only the rows that are new. Expenses entered by hand (add_expense) get
+# the fingerprint an import of them would have, so an export of them
+# imports as duplicates too.
+IMPORT_BATCH_SIZE = 5000
+
+
+def _read_lines(file, counter):
+    """Yield decoded lines from a binary file, tracking bytes read in counter[0]."""
+    for raw in file:
+        counter[0] += len(raw)
+        yield raw.decode("utf-8-sig")
+
+
+def _import_reader(lines):
+    reader = csv.DictReader(lines)
+    missing = {"Amount", "Category", "Date"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+    return reader
+
+
+def _parse_import_row(row):
+    """
+    One CSV row as (cents, category name, ts, description, reference).
+    Raises ValueError with a message for the import report.
+    """
+    amount, category, date = row["Amount"], row["Category"], row["Date"]
+    if amount is None or category is None or date is None:
+        raise ValueError("row has too few columns")
+
+    category = category.strip()
+    if not category:
+        raise ValueError("missing category")
+
+    # Description and Reference are optional, so older exports still import.
+    return (to_cents(amount), category, to_timestamp(date),
+            _clean_description(row.get("Description")), (row.get("Reference") or "").strip())
+
+
+def import_fingerprint(ts, cents, category, reference="", ordinal=1):
+    """
+    64-bit fingerprint of an imported expense: date, amount, category
+    name, source reference, and which of several identical rows it is.
+    """
+    key = f"{ts}\x1f{cents}\x1f{category}\x1f{reference}\x1f{ordinal}"
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _fingerprinter():
+    """
+    Turn one file's parsed rows, in file order, into import tuples
+    (cents, category name, ts, description, fingerprint).
+    """
+    seen = Counter()
+
+    def fingerprint(row):
+        cents, category, ts, description, reference = row
+        key = (ts, cents, category, reference)
+        seen[key] += 1
+        return cents, category, ts, description, import_fingerprint(*key, seen[key])
+
+    return fingerprint
+
+
+def _sort_archived(archived, report, where=lambda line: line):
+    """
+    Import tuples dated in archived years can't be inserted: count those
+    the archives already hold as duplicates, report the rest as errors.
+    archived holds (line, import tuple) pairs.
+    """
+    found = set()
+    for year, file, start, end in _segments(hot=False):
+        fingerprints = [item[4] for _, item in archived if start <= item[2] < end]
+        if not fingerprints:
+            continue
+        schema = _schema(year, file)
+        if connect().execute(f"PRAGMA {schema}.user_version").fetchone()[0] < 2:
+            continue  # archived before expenses had fingerprints
+        for i in range(0, len(fingerprints), 500):
+            chunk = fingerprints[i:i + 500]
+            cur = connect().execute(f"""
+                SELECT fingerprint FROM {schema}.expenses
+                WHERE fingerprint IN ({",".join("?" * len(chunk))})
+            """, chunk)
+            found.update(row[0] for row in cur)
+
+    for line, item in archived:
+        if item[4] in found:
+            report["duplicates"] += 1
+        else:
+            report["errors"].append(
+                (where(line), f"{format_timestamp(item[2], '%Y-%m-%d')} is in an archived year"))
+
+
+# Row-at-a-time triggers cost more than the inserts themselves (the FTS
+# one most of all), so import batches suspend the insert triggers inside
+# their transaction and apply the same changes once, as set operations
+# over the new rows. DDL is transactional: other connections never see
+# the triggers missing, and a failed batch rolls them back with its rows.
+BULK_SUSPENDED_TRIGGERS = ("trg_expenses_insert", "trg_expenses_fts_insert")
+
+
+@contextmanager
+def _suspended_triggers(cur, names):
+    """Drop triggers for the body of a transaction() block, then recreate them."""
+    cur.execute(f"""
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'trigger' AND name IN ({", ".join("?" * len(names))})
+    """, names)
+    saved = cur.fetchall()
+    for name, _ in saved:
+        cur.execute(f"DROP TRIGGER {name}")
+    yield
+    for _, sql in saved:
+        cur.execute(sql)
+
+
+def _apply_insert_triggers(cur, first_id):
+    """What trg_expenses_insert and trg_expenses_fts_insert do, for every row from first_id."""
+    cur.execute("""
+        UPDATE expense_summary
+        SET total_cents = total_cents
+                + (SELECT IFNULL(SUM(amount_cents), 0) FROM expenses WHERE id >= :first),
+            count = count + (SELECT COUNT(*) FROM expenses WHERE id >= :first)
+        WHERE id = 1
+    """, {"first": first_id})
+
+    cur.execute("""
+        INSERT INTO category_totals (category_id, total_cents, count)
+        SELECT IFNULL(category_id, 0), SUM(amount_cents), COUNT(*)
+        FROM expenses WHERE id >= ?
+        GROUP BY 1
+        ON CONFLICT (category_id) DO UPDATE
+        SET total_cents = total_cents + excluded.total_cents, count = count + excluded.count
+    """, (first_id,))
+
+    cur.execute(f"""
+        INSERT INTO period_totals (period, category_id, total_cents, count)
+        SELECT {PERIOD_SQL.format(ts="ts")}, IFNULL(category_id, 0), SUM(amount_cents), COUNT(*)
+        FROM expenses WHERE id >= ?
+        GROUP BY 1, 2
+        ON CONFLICT (period, category_id) DO UPDATE
+        SET total_cents = total_cents + excluded.total_cents, count = count + excluded.count
+    """, (first_id,))
+
+    cur.execute("""
+        INSERT INTO expenses_fts (rowid, description)
+        SELECT id, description FROM expenses
+        WHERE id >= ? AND description IS NOT NULL
+    """, (first_id,))
+
+
+def _flush_import_batch(batch, category_ids):
+    """Insert a batch of import tuples; returns how many were new (not duplicates)."""
+    with transaction() as cur:
+        # Drop rows already present (or repeated within the batch, as when
+        # two files hold the same export) before inserting: an INSERT the
+        # unique index rejects still uses up an AUTOINCREMENT id.
+        seen = set()
+        for i in range(0, len(batch), 500):
+            chunk = [item[4] for item in batch[i:i + 500]]
+            cur.execute(f"""
+                SELECT fingerprint FROM expenses
+                WHERE fingerprint IN ({",".join("?" * len(chunk))})
+            """, chunk)
+            seen.update(row[0] for row in cur)
+        fresh = []
+        for item in batch:
+            if item[4] not in seen:
+                seen.add(item[4])
+                fresh.append(item)
+        if not fresh:
+            return 0
 
-    with open(path, "r", encoding="utf-8") as file:
-        reader = csv.DictReader(file)
+        new = {row[1] for row in fresh} - category_ids.keys()
+        for name in new:
+            # OR IGNORE: another writer may have added it since we cached
+            cur.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (name,))
+            cur.execute("SELECT id FROM categories WHERE name=?", (name,))
+            category_ids[name] = cur.fetchone()[0]
+        if new:
+            invalidate_categories()
+
+        # AUTOINCREMENT ids only grow, so the batch is every id past the current max.
+        cur.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM expenses")
+        first_id = cur.fetchone()[0]
+        with _suspended_triggers(cur, BULK_SUSPENDED_TRIGGERS):
+            cur.executemany("""
+                INSERT INTO expenses (amount_cents, category_id, ts, description, fingerprint)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(cents, category_ids[category], ts, description, fingerprint)
+                  for cents, category, ts, description, fingerprint in fresh])
+            _apply_insert_triggers(cur, first_id)
+    return len(fresh)
+
+
+@profiled("db.import_expenses_csv")
+def import_expenses_csv(path, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Stream a CSV with Amount, Category and Date (and optionally
+    Description) columns into expenses.
+
+    Rows are inserted in batches of batch_size, each committed on its own,
+    so a huge file never holds the write lock for long. Bad rows are
+    skipped and reported rather than aborting the import, and rows an
+    earlier import already added are skipped and counted as duplicates.
+
+    progress, if given, is called after every batch as
+    progress(rows_imported, bytes_read, total_bytes); returning False
+    cancels the import (rows already committed are kept).
+
+    Returns {"imported": int, "duplicates": int, "errors": [(line, message)],
+    "cancelled": bool}.
+    """
+    category_ids = dict(category_registry().ids)
+    floor = archive_floor()
+    fingerprint = _fingerprinter()
+    report = {"imported": 0, "duplicates": 0, "errors": [], "cancelled": False}
+    batch, archived = [], []
+    bytes_read = [0]
+
+    def flush():
+        added = _flush_import_batch(batch, category_ids)
+        report["imported"] += added
+        report["duplicates"] += len(batch) - added
+        batch.clear()
+        if progress is not None and progress(report["imported"], bytes_read[0], total_bytes) is False:
+            report["cancelled"] = True
+
+    with open(path, "rb") as file:
+        total_bytes = os.fstat(file.fileno()).st_size
+        reader = _import_reader(_read_lines(file, bytes_read))
 
         for row in reader:
-            amount = float(row["Amount"])
-            category = row["Category"]
-            date = row["Date"]
-
-            # Ensure category exists
-            cur.execute("SELECT id FROM categories WHERE name=?", (category,))
-            res = cur.fetchone()
-
-            if res:
-                cat_id = res[0]
-            else:
-                cur.execute("INSERT INTO categories (name) VALUES (?)", (category,))
-                cat_id = cur.lastrowid
-
-            # Insert expense
-            cur.execute("""
-                INSERT INTO expenses (amount, category_id, date)
-                VALUES (?, ?, ?)
-            """, (amount, cat_id, date))
-
-    conn.commit()
-    conn.close()
+            try:
+                item = fingerprint(_parse_import_row(row))
+            except ValueError as exc:
+                report["errors"].append((reader.line_num, str(exc)))
+                continue
+
+            if item[2] < floor:
+                archived.append((reader.line_num, item))
+                if len(archived) >= batch_size:
+                    _sort_archived(archived, report)
+                    archived.clear()
+                continue
+
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+                if report["cancelled"]:
+                    _sort_archived(archived, report)
+                    return report
+
+        if batch:
+            flush()
+        elif progress is not None:
+            progress(report["imported"], bytes_read[0], total_bytes)
+
+    _sort_archived(archived, report)
+    return report
+
+
+# -----------------------------
+# BULK IMPORT
+# -----------------------------
+# A year of statements is dozens of CSV files. Parsing (amounts, dates,
+# category names) is pure CPU work, so each file is parsed in its own
+# process; the parsed rows come back to this process, which stays the
+# only writer and inserts them in large transactions, in file order.
+# Only IMPORT_PREFETCH files per process are parsed ahead of the writer,
+# so memory stays bounded however many files there are.
+#
+# The pool uses "spawn" everywhere: forking a process whose other
+# threads may hold SQLite or Tk state is unsafe, and it is what Windows
+# and frozen builds do anyway (see multiprocessing.freeze_support() in
+# budget_app). multiprocessing is imported only when a pool is needed.
+BULK_IMPORT_BATCH_SIZE = 50_000
+IMPORT_PREFETCH = 2
+
+
+def import_paths(paths):
+    """Expand paths (files or directories of *.csv) into a sorted file list."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(".csv") and os.path.isfile(os.path.join(path, name))
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def _parse_import_file(path, floor=MIN_TS):
+    """
+    Parse one CSV in a pool process: (rows, archived, errors), where rows
+    are fingerprinted import tuples, archived are (line, tuple) for rows
+    dated before floor, and errors are (line, message). Touches no database.
+    """
+    fingerprint = _fingerprinter()
+    rows, archived, errors = [], [], []
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as file:
+            reader = _import_reader(file)
+            for row in reader:
+                try:
+                    item = fingerprint(_parse_import_row(row))
+                except ValueError as exc:
+                    errors.append((reader.line_num, str(exc)))
+                    continue
+                if item[2] < floor:
+                    archived.append((reader.line_num, item))
+                else:
+                    rows.append(item)
+    except (OSError, UnicodeDecodeError, ValueError) as exc:
+        errors.append((None, str(exc)))
+    return rows, archived, errors
+
+
+@profiled("db.import_expense_files")
+def import_expense_files(paths, processes=None, batch_size=BULK_IMPORT_BATCH_SIZE,
+                         progress=None):
+    """
+    Import many CSV files (or directories of them), parsing in a process
+    pool and inserting from this thread only. Each file is read like
+    import_expenses_csv(); a file that cannot be read or lacks a column is
+    reported and skipped. Rows already in the database are skipped and
+    counted as duplicates.
+
+    processes defaults to one per CPU, capped at the number of files; with
+    one, files are parsed inline. progress, if given, is called after each
+    file as progress(rows_imported, files_done, total_files); returning
+    False cancels (rows already committed are kept).
+
+    Returns {"imported": int, "duplicates": int, "files": int,
+    "errors": [(where, message)], "cancelled": bool}, where is
+    "name.csv:line" or "name.csv".
+    """
+    files = import_paths(paths)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(files)))
+    category_ids = dict(category_registry().ids)
+    floor = archive_floor()
+    report = {"imported": 0, "duplicates": 0, "files": 0, "errors": [], "cancelled": False}
+    batch = []
+
+    def flush(count):
+        chunk = batch[:count]
+        del batch[:count]
+        added = _flush_import_batch(chunk, category_ids)
+        report["imported"] += added
+        report["duplicates"] += len(chunk) - added
+
+    def consume(path, rows, archived, errors):
+        name = os.path.basename(path)
+        report["errors"].extend((name if line is None else f"{name}:{line}", message)
+                                for line, message in errors)
+        _sort_archived(archived, report, where=lambda line: f"{name}:{line}")
+        batch.extend(rows)
+        while len(batch) >= batch_size:
+            flush(batch_size)
+        report["files"] += 1
+        if progress is not None:
+            return progress(report["imported"] + len(batch), report["files"], len(files)) is not False
+        return True
+
+    if processes == 1:
+        for path in files:
+            if not consume(path, *_parse_import_file(path, floor)):
+                report["cancelled"] = True
+                break
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(processes, mp_context=context) as pool:
+            pending = deque()
+            queued = iter(files)
+            try:
+                for path in islice(queued, processes * IMPORT_PREFETCH):
+                    pending.append((path, pool.submit(_parse_import_file, path, floor)))
+                while pending:
+                    # Oldest first: parsing runs ahead while rows land in file order.
+                    path, future = pending.popleft()
+                    if not consume(path, *future.result()):
+                        report["cancelled"] = True
+                        break
+                    for path in islice(queued, 1):
+                        pending.append((path, pool.submit(_parse_import_file, path, floor)))
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+    if batch:
+        flush(len(batch))
+    return report
+
+
+# -----------------------------
+# SNAPSHOT / RESTORE
+# -----------------------------
+# Whole-database copies through SQLite's online backup API: pages are
+# copied as they are, so a snapshot keeps everything a CSV loses (budgets,
+# category ids, rollups, the search index) and takes about as long as
+# copying the file.
+#
+# snapshot_database() copies SNAPSHOT_PAGES pages per step from its own
+# connection, inside one read transaction: with WAL the app keeps
+# writing meanwhile, and the copy is the database as of the moment it
+# started. restore_snapshot() copies the other way, into the live file,
+# as one write transaction, so every connection (in this process or
+# another) sees either the old data or the restored data, never a mix.
+SNAPSHOT_PAGES = 4096
+SNAPSHOT_GZIP_LEVEL = 1  # a multi-GB file should take seconds, not minutes
+SNAPSHOT_CHUNK_BYTES = 1 << 20
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def _backup(source, target, pages, progress, stage):
+    """source.backup(target) in steps, reporting progress(stage, copied, total)."""
+    def step(status, remaining, total):
+        if progress(stage, total - remaining, total) is False:
+            raise _Cancelled
+
+    source.backup(target, pages=pages, progress=step if progress is not None else None)
+
+
+def _copy_file(src_path, dst_path, opener_out, progress, stage, unpack=None):
+    """
+    Copy src_path (read through unpack, e.g. gzip.GzipFile, if given) to
+    opener_out(dst_path). Progress counts bytes of src_path, so done and
+    total are in the same units even when the copy decompresses.
+    """
+    total = os.path.getsize(src_path)
+    with open(src_path, "rb") as raw, opener_out(dst_path) as dst:
+        src = raw if unpack is None else unpack(fileobj=raw)
+        while chunk := src.read(SNAPSHOT_CHUNK_BYTES):
+            dst.write(chunk)
+            if progress is not None and progress(stage, raw.tell(), total) is False:
+                raise _Cancelled
+
+
+def _temp_path(near):
+    """A fresh path in the directory of near, so os.replace() stays atomic."""
+    directory = os.path.dirname(os.path.abspath(near))
+    fd, path = tempfile.mkstemp(prefix=".budget-", suffix=".tmp", dir=directory)
+    os.close(fd)
+    return path
+
+
+def _remove(*paths):
+    for path in paths:
+        if path is not None:
+            for suffix in ("", "-journal", "-wal", "-shm"):
+                try:
+                    os.remove(path + suffix)
+                except FileNotFoundError:
+                    pass
+
+
+@profiled("db.snapshot_database")
+def snapshot_database(path, compress=None, pages=SNAPSHOT_PAGES, progress=None):
+    """
+    Write a consistent copy of the live database to path, without blocking
+    writers. compress=None gzips when path ends in ".gz".
+
+    progress, if given, is called as progress(stage, done, total) with
+    stage "copy" (pages) or "compress" (bytes); returning False cancels
+    and leaves nothing at path. The file only appears at path once
+    complete. Archived years (archive_years()) stay in their own files
+    and are not part of the snapshot. Returns True, or False when
+    cancelled.
+    """
+    if compress is None:
+        compress = str(path).endswith(".gz")
+
+    copy = _temp_path(path)
+    packed = _temp_path(path) if compress else None
+    source = _open(DB_NAME)
+    try:
+        target = sqlite3.connect(copy)
+        try:
+            # Hold one read transaction across every step, so the copy is
+            # a single point in time and never restarts on a concurrent write.
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            _backup(source, target, pages, progress, "copy")
+            source.rollback()
+            # A snapshot is one self-contained file.
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+
+        if compress:
+            _copy_file(copy, packed,
+                       lambda p: gzip.open(p, "wb", compresslevel=SNAPSHOT_GZIP_LEVEL),
+                       progress, "compress")
+            os.replace(packed, path)
+        else:
+            os.replace(copy, path)
+        return True
+    except _Cancelled:
+        return False
+    finally:
+        source.close()
+        _remove(copy, packed)
+
+
+def _check_snapshot(conn):
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        tables = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    except sqlite3.DatabaseError as exc:
+        raise ValueError(f"not a Budget-er snapshot ({exc})") from None
+    if "expenses" not in tables or "categories" not in tables:
+        raise ValueError("not a Budget-er snapshot")
+    if version > SCHEMA_VERSION:
+        raise ValueError("the snapshot was made by a newer version of Budget-er")
+
+
+@profiled("db.restore_snapshot")
+def restore_snapshot(path, pages=SNAPSHOT_PAGES, progress=None):
+    """
+    Replace the live database with the snapshot at path (plain or ".gz"),
+    atomically, then upgrade it if it is from an older version.
+
+    Run it from the writer thread. progress works as in
+    snapshot_database(), with stages "decompress" and "copy"; cancelling
+    leaves the live database untouched. Returns True, or False when
+    cancelled.
+    """
+    with open(path, "rb") as file:
+        compressed = file.read(2) == b"\x1f\x8b"
+
+    unpacked = _temp_path(DB_NAME) if compressed else None
+    try:
+        if compressed:
+            _copy_file(path, unpacked, lambda p: open(p, "wb"),
+                       progress, "decompress", unpack=gzip.GzipFile)
+
+        uri = Path(os.path.abspath(unpacked or path)).as_uri() + "?mode=ro"
+        source = sqlite3.connect(uri, uri=True)
+        try:
+            _check_snapshot(source)
+            _backup(source, connect(), pages, progress, "copy")
+        finally:
+            source.close()
+        _bump_revision()
+    except _Cancelled:
+        return False
+    finally:
+        _remove(unpacked)
+
+    invalidate_categories()
+    migrate()
+    # The restore went through the WAL; fold it back into the main file.
+    connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return True
@@ -1,43 +1,228 @@
-from budget_db import get_budget, get_expenses
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+
+from budget_db import (
+    get_budget, get_period_total, current_period,
+    add_recurring, get_recurring, get_recurring_done, confirm_recurring, transaction,
+)
+from budget_profile import profiled
+from budget_units import from_timestamp, now_timestamp, to_timestamp
+
+
+# -----------------------------
+# PERIOD HELPERS
+# -----------------------------
+def shift_period(period, months):
+    """The "YYYY-MM" period months away from period (negative goes back)."""
+    year, month = map(int, period.split("-"))
+    index = year * 12 + (month - 1) + months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def period_bounds(period):
+    """(start, end) timestamps for a period, end exclusive."""
+    return to_timestamp(f"{period}-01"), to_timestamp(f"{shift_period(period, 1)}-01")
+
+
+def weeks_left(period, today=None):
+    """
+    Weeks the remaining money has to last: what is left of the current
+    month, or the whole month for any other period. Never below one week.
+    """
+    year, month = map(int, period.split("-"))
+    days = calendar.monthrange(year, month)[1]
+    today = today or date.today()
+    if (today.year, today.month) == (year, month):
+        days = days - today.day + 1
+    return max(days / 7, 1)
+
+
+# -----------------------------
+# RECURRING OCCURRENCES
+# -----------------------------
+# Rules are expanded on demand for the window being viewed. The n-th
+# occurrence is computed directly from the rule's start, so expanding a
+# month of a rule that began years ago costs a few steps, not years.
+# Monthly and yearly rules keep the start's day of month, clamped to
+# shorter months (a rule starting on the 31st falls on Feb 28/29).
+Occurrence = namedtuple("Occurrence", "rule_id ts amount category description")
+
+
+def _nth_occurrence(rule, start, n):
+    if rule.frequency == "weekly":
+        return start + timedelta(weeks=n * rule.interval)
+    months = n * rule.interval * (12 if rule.frequency == "yearly" else 1)
+    index = start.year * 12 + start.month - 1 + months
+    year, month = divmod(index, 12)
+    day = min(start.day, calendar.monthrange(year, month + 1)[1])
+    return start.replace(year=year, month=month + 1, day=day)
+
+
+def _first_index(rule, start, ts):
+    """The lowest n whose occurrence is at or after ts (a lower bound, refined by the caller)."""
+    if ts <= rule.start:
+        return 0
+    first = from_timestamp(ts)
+    if rule.frequency == "weekly":
+        n = (first - start).days // (7 * rule.interval)
+    else:
+        step = rule.interval * (12 if rule.frequency == "yearly" else 1)
+        n = ((first.year - start.year) * 12 + first.month - start.month) // step
+    return max(n - 1, 0)
+
+
+def occurrences(rule, start=None, end=None):
+    """Yield the timestamps of rule's occurrences with start <= ts < end."""
+    origin = from_timestamp(rule.start)
+    lower = rule.start if start is None else max(start, rule.start)
+    bounds = [bound for bound in (end, rule.end) if bound is not None]
+    if not bounds:
+        raise ValueError("an open-ended rule needs an end to expand to")
+    upper = min(bounds)
+
+    n = _first_index(rule, origin, lower)
+    while True:
+        ts = to_timestamp(_nth_occurrence(rule, origin, n))
+        if ts >= upper:
+            return
+        if ts >= lower:
+            yield ts
+        n += 1
+
+
+def pending_occurrences(start, end):
+    """Occurrences in [start, end) not yet confirmed or skipped, by date."""
+    done = get_recurring_done(start, end)
+    pending = [
+        Occurrence(rule.id, ts, rule.amount, rule.category, rule.description)
+        for rule in get_recurring(start, end)
+        for ts in occurrences(rule, start, end)
+        if (rule.id, ts) not in done
+    ]
+    pending.sort(key=lambda o: (o.ts, o.rule_id))
+    return pending
+
+
+def scheduled_total(start, end):
+    """Cents still to be spent on pending occurrences in [start, end)."""
+    return sum(o.amount for o in pending_occurrences(start, end))
+
+
+def confirm_occurrence(rule_id, ts):
+    """Record an occurrence as a real expense; returns its row (None if already done)."""
+    for rule in get_recurring(ts, ts + 1):
+        if rule.id == rule_id and ts in occurrences(rule, ts, ts + 1):
+            return confirm_recurring(rule_id, ts)
+    raise ValueError(f"no occurrence of rule {rule_id} at {ts}")
+
+
+def add_recurring_expense(amount, category_id, frequency, description=None, start=None):
+    """
+    Start a rule at start (default now) and confirm its first occurrence,
+    which is the expense being entered. Returns that expense's row.
+    """
+    start = now_timestamp() if start is None else start
+    with transaction():
+        rule_id = add_recurring(amount, category_id, frequency, start, description=description)
+        return confirm_recurring(rule_id, start)
+
+
+# -----------------------------
+# MONTH-END PROJECTION
+# -----------------------------
+# Read from the monthly rollups only (a row per category per month), so
+# the dashboard summary costs the same however many expenses there are.
+PROJECTION_LOOKBACK_MONTHS = 3
+
+
+def _days_in(period):
+    year, month = map(int, period.split("-"))
+    return calendar.monthrange(year, month)[1]
+
+
+def project_month_end(period, today=None):
+    """
+    Projected cents spent in a "YYYY-MM" period: what is spent so far plus,
+    for the days still to come, the average daily spend of the
+    PROJECTION_LOOKBACK_MONTHS months before this one and of this month so
+    far. Past months project to what was spent, future months to a full
+    month at that rate.
+    """
+    today = today or date.today()
+    this_month = f"{today.year:04d}-{today.month:02d}"
+    if period < this_month:
+        return get_period_total(period)
+
+    months = [shift_period(this_month, -n) for n in range(1, PROJECTION_LOOKBACK_MONTHS + 1)]
+    so_far = get_period_total(this_month)
+    recent = so_far + sum(get_period_total(month) for month in months)
+    rate = recent / (today.day + sum(_days_in(month) for month in months))
+
+    if period == this_month:
+        return so_far + round(rate * (_days_in(period) - today.day))
+    return round(rate * _days_in(period))
+
+
+@profiled("logic.calculate_summary")
+def calculate_summary(period=None):
+    """Dashboard figures for a period. Money values are integer cents."""
+    period = period or current_period()
 
-def calculate_summary():
     # -----------------------------
     # Load budget base values
     # -----------------------------
-    budget = get_budget()
+    budget = get_budget(period)
     if budget is None:
         return {
+            "period": period,
+            "spent": 0,
+            "scheduled": 0,
+            "projected": 0,
             "remaining": 0,
             "savings_percent": 0,
             "weekly_allowance": 0,
             "overspending": False,
+            "projected_overspending": False,
             "negative_cash": False,
         }
 
-    income, savings, cash = float(budget[0]), float(budget[1]), float(budget[2])
+    income, savings, cash = budget
 
     # -----------------------------
-    # Calculate total expenses
+    # Expenses for this period (O(categories) rollup read)
     # -----------------------------
-    expenses = get_expenses()
-    total_expenses = sum(float(row[1]) for row in expenses)
+    total_expenses = get_period_total(period)
+
+    # Recurring occurrences still pending this period are money already
+    # committed: they come off what remains, and the projection never
+    # falls below them. Their history is in the daily average already.
+    scheduled = scheduled_total(*period_bounds(period))
+
+    projected = max(project_month_end(period), total_expenses + scheduled)
 
     # -----------------------------
     # Core summary calculations
     # -----------------------------
-    remaining = income - total_expenses - savings
-    overspending = remaining < 0
+    remaining = income - total_expenses - scheduled - savings
+    overspending = income - total_expenses - savings < 0
+    projected_overspending = income - projected - savings < 0
     negative_cash = cash < 0
 
     # Avoid division by zero
     savings_percent = (savings / income * 100) if income > 0 else 0
 
-    weekly_allowance = remaining / 4 if remaining > 0 else 0
+    weekly_allowance = round(remaining / weeks_left(period)) if remaining > 0 else 0
 
     return {
+        "period": period,
+        "spent": total_expenses,
+        "scheduled": scheduled,
+        "projected": projected,
         "remaining": remaining,
         "savings_percent": savings_percent,
         "weekly_allowance": weekly_allowance,
         "overspending": overspending,
+        "projected_overspending": projected_overspending,
         "negative_cash": negative_cash,
     }
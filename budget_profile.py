@@ -0,0 +1,250 @@
+import atexit
+import bisect
+import functools
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# -----------------------------
+# OPT-IN INSTRUMENTATION
+# -----------------------------
+# Off by default and close to free when off: profiled functions check one
+# global and call straight through, and connections are plain sqlite3
+# connections. Turn it on with BUDGETER_PROFILE=1 (optionally
+# BUDGETER_SLOW_MS=<threshold>) or by calling enable().
+#
+# When on, it records per function call counts, a latency histogram and
+# rows returned, and times every SQL statement; statements slower than
+# the threshold are logged to "budgeter.profile" with their query plan.
+log = logging.getLogger("budgeter.profile")
+
+DEFAULT_SLOW_MS = 50.0
+
+# Upper bounds (ms) of the latency histogram buckets; the last is open-ended.
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+_enabled = False
+_slow_ms = DEFAULT_SLOW_MS
+_stats = {}
+_lock = threading.Lock()
+_atexit_registered = False
+
+
+class _Stat:
+    __slots__ = ("calls", "total_ms", "max_ms", "rows", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(slow_ms=DEFAULT_SLOW_MS, report_on_exit=True):
+    """Start recording. New database connections are instrumented."""
+    global _enabled, _slow_ms, _atexit_registered
+    _enabled = True
+    _slow_ms = slow_ms
+    if report_on_exit and not _atexit_registered:
+        atexit.register(_report_at_exit)
+        _atexit_registered = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def record(name, elapsed_ms, rows=None):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = _Stat()
+        stat.calls += 1
+        stat.total_ms += elapsed_ms
+        stat.max_ms = max(stat.max_ms, elapsed_ms)
+        if rows is not None:
+            stat.rows += rows
+        stat.histogram[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+
+def _row_count(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        return 1
+    if result is None:
+        return 0
+    return None
+
+
+def profiled(name):
+    """Decorator: time calls to the function under name while profiling is on."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            record(name, (time.perf_counter() - start) * 1000, _row_count(result))
+            return result
+        return wrapper
+    return wrap
+
+
+# -----------------------------
+# SQL STATEMENT TIMING
+# -----------------------------
+# A statement's cost is split between execute() and the fetches that
+# step through its results, so the cursor keeps a running total and
+# records it once the results are exhausted (or the cursor moves on).
+def _plan(conn, sql, params, many):
+    if many:
+        params = next(iter(params), ())
+    try:
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except sqlite3.Error:
+        return []
+    return [row[3] for row in rows]
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    _statement = None  # [sql, params, many, elapsed_ms, rows]
+
+    def execute(self, sql, params=()):
+        return self._run(super().execute, sql, params, False)
+
+    def executemany(self, sql, params):
+        return self._run(super().executemany, sql, list(params), True)
+
+    def _run(self, method, sql, params, many):
+        self._finish()
+        start = time.perf_counter()
+        method(sql, params)
+        self._statement = [sql, params, many, (time.perf_counter() - start) * 1000, 0]
+        if self.description is None:
+            self._finish()  # no result rows to fetch
+        return self
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        if self._statement is not None:
+            self._statement[3] += (time.perf_counter() - start) * 1000
+        return result
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if self._statement is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._statement[4] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._fetch(super().fetchmany, size)
+        if self._statement is not None:
+            self._statement[4] += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        if self._statement is not None:
+            self._statement[4] += len(rows)
+            self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _finish(self):
+        if self._statement is None:
+            return
+        sql, params, many, elapsed, rows = self._statement
+        self._statement = None
+
+        record("sql: " + " ".join(sql.split())[:80], elapsed, rows)
+        if elapsed >= _slow_ms:
+            log.warning("slow statement (%.1f ms, %d rows)%s:\n%s\nplan:\n  %s",
+                        elapsed, rows, " [executemany]" if many else "", sql.strip(),
+                        "\n  ".join(_plan(self.connection, sql, params, many)) or "(none)")
+
+
+class ProfiledConnection(sqlite3.Connection):
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, params):
+        return self.cursor().executemany(sql, params)
+
+
+def connection_factory():
+    """The sqlite3.connect(factory=...) to use for new connections."""
+    return ProfiledConnection if _enabled else sqlite3.Connection
+
+
+# -----------------------------
+# REPORTS
+# -----------------------------
+def report():
+    """Text profile of everything recorded so far, slowest total first."""
+    with _lock:
+        items = sorted(_stats.items(), key=lambda kv: kv[1].total_ms, reverse=True)
+        lines = [
+            f"{'name':<52} {'calls':>7} {'total ms':>10} {'avg ms':>8} {'max ms':>8} {'rows':>9}",
+        ]
+        for name, stat in items:
+            avg = stat.total_ms / stat.calls if stat.calls else 0
+            lines.append(f"{name[:52]:<52} {stat.calls:>7} {stat.total_ms:>10.1f} "
+                         f"{avg:>8.2f} {stat.max_ms:>8.2f} {stat.rows:>9}")
+
+        lines.append("")
+        lines.append("latency histogram (calls per bucket, upper bound in ms)")
+        edges = [f"<={b:g}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]:g}"]
+        for name, stat in items:
+            cells = [f"{edge}:{count}" for edge, count in zip(edges, stat.histogram) if count]
+            lines.append(f"  {name[:52]:<52} " + " ".join(cells))
+
+    return "\n".join(lines)
+
+
+def dump(path=None):
+    """Write report() to path, or to stderr when no path is given."""
+    text = report()
+    if path is None:
+        print(text, file=sys.stderr)
+    else:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    return text
+
+
+def _report_at_exit():
+    if _stats:
+        dump(os.environ.get("BUDGETER_PROFILE_REPORT"))
+
+
+if os.environ.get("BUDGETER_PROFILE"):
+    enable(float(os.environ.get("BUDGETER_SLOW_MS", DEFAULT_SLOW_MS)))
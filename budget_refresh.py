@@ -0,0 +1,83 @@
+from budget_db import current_revision, get_revision
+
+# -----------------------------
+# REFRESH SCHEDULER
+# -----------------------------
+# Every committed write bumps budget_db's revision number. Open views
+# (dashboard summary, Expense Manager, Charts) subscribe here with the
+# revision they are showing. After a write the UI calls notify(); checks
+# are debounced through root.after, so a burst of writes ends in a
+# single check, and each view recomputes at most once per check, and
+# only if the revision moved past what it shows. A slow poll catches
+# writes made by other processes (via PRAGMA data_version).
+DEBOUNCE_MS = 150
+POLL_MS = 2000
+
+
+class RefreshScheduler:
+    def __init__(self, root, worker, debounce_ms=DEBOUNCE_MS, poll_ms=POLL_MS):
+        self.root = root
+        self.worker = worker
+        self.debounce_ms = debounce_ms
+        self.poll_ms = poll_ms
+        self._views = {}  # name -> [refresh, owner, revision shown]
+        self._after = None
+        if poll_ms:
+            root.after(poll_ms, self._poll)
+
+    def subscribe(self, name, refresh, owner=None, revision=None):
+        """
+        Call refresh(revision) on the Tk thread whenever the data moves past
+        revision (what the view shows now; None refreshes at the next check).
+        The subscription ends with unsubscribe() or when owner is destroyed.
+        """
+        self._views[name] = [refresh, owner, revision]
+
+    def unsubscribe(self, name):
+        self._views.pop(name, None)
+
+    def advance(self, name, before, after):
+        """
+        A view applied one write itself (e.g. inserted the new row): move it
+        from revision before to after without a recompute. Ignored unless
+        that write is the only change since what the view shows.
+        """
+        view = self._views.get(name)
+        if view is not None and view[2] == before and after == before + 1:
+            view[2] = after
+
+    def notify(self):
+        """Data changed: check the views once the burst of writes settles."""
+        if self._after is not None:
+            self.root.after_cancel(self._after)
+        self._after = self.root.after(self.debounce_ms, self._check)
+
+    def _check(self):
+        self._after = None
+        self.worker.read(get_revision, key="refresh-revision", on_done=self._dispatch)
+
+    def _dispatch(self, revision):
+        for name, view in list(self._views.items()):
+            refresh, owner, shown = view
+            if owner is not None and not owner.winfo_exists():
+                del self._views[name]
+                continue
+            if shown == revision:
+                continue
+            view[2] = revision
+            refresh(revision)
+
+    def _poll(self):
+        if self._after is None:
+            self._check()
+        self.root.after(self.poll_ms, self._poll)
+
+
+def tracked(fn, *args, **kwargs):
+    """
+    Run a write on the worker and return (result, revision before, revision
+    after), for RefreshScheduler.advance(). Submit it with worker.write().
+    """
+    before = current_revision()
+    result = fn(*args, **kwargs)
+    return result, before, current_revision()
@@ -0,0 +1,308 @@
+"""
+Headless monthly reports: the dashboard summary plus the pie, bar, trend
+and percentile charts for a period, rendered with matplotlib's Agg (PNG)
+or SVG backend into a directory with an HTML page per period. Needs no
+display, so it runs from cron or a mail job:
+
+    python budget_report.py --db budget.db --out reports --period 2026-09
+    python budget_report.py --all --format png,svg --jobs 4
+
+Each period's directory keeps a fingerprint of the data it was drawn
+from; a period whose data has not changed is never rendered again.
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import threading
+
+import budget_db
+from budget_analytics import (
+    category_percentiles, load_columns, monthly_totals_from, rolling_average,
+    scheduled_by_month,
+)
+from budget_charts import (
+    draw_category_bars, draw_category_pie, draw_monthly_trend, draw_percentiles
+)
+from budget_logic import calculate_summary, current_period, period_bounds, shift_period
+from budget_profile import profiled
+from budget_units import format_money, from_cents
+
+# -----------------------------
+# REPORT DATA
+# -----------------------------
+# Everything a report draws, as plain JSON-able values: it is what the
+# fingerprint hashes and what render processes receive, so rendering
+# never touches the database. A past period only depends on its own and
+# earlier months, so its fingerprint stays put as new data arrives.
+REPORT_TREND_MONTHS = 12
+REPORT_VERSION = 1  # bump when the output changes, to re-render every period
+FORMATS = ("png", "svg")
+CHARTS = ("pie", "bars", "trend", "percentiles")
+FINGERPRINT_FILE = ".fingerprint"
+DPI = 100
+
+_data_cache = {}  # period -> (revision, data)
+_data_lock = threading.Lock()
+
+
+def report_data(period):
+    """The summary and chart data for one "YYYY-MM" period, cached per data revision."""
+    revision = budget_db.get_revision()
+    with _data_lock:
+        cached = _data_cache.get(period)
+    if cached is not None and cached[0] == revision:
+        return cached[1]
+
+    data = {
+        "period": period,
+        "summary": calculate_summary(period),
+        "categories": [
+            [name if name is not None else "Uncategorized", total]
+            for name, total in budget_db.get_period_totals(period)
+        ],
+        "trends": _trends(period),
+    }
+    with _data_lock:
+        _data_cache[period] = (revision, data)
+    return data
+
+
+def _trends(period):
+    """Trend chart data for the REPORT_TREND_MONTHS months ending at period."""
+    first = shift_period(period, 1 - REPORT_TREND_MONTHS)
+    periods = [shift_period(first, i) for i in range(REPORT_TREND_MONTHS)]
+    totals = monthly_totals_from(first, REPORT_TREND_MONTHS)
+
+    # Pending recurring expenses, for the months from this one on.
+    scheduled = [0] * REPORT_TREND_MONTHS
+    upcoming = max(current_period(), first)
+    if upcoming <= period:
+        offset = periods.index(upcoming)
+        scheduled[offset:] = scheduled_by_month(upcoming, REPORT_TREND_MONTHS - offset).tolist()
+
+    names = budget_db.category_registry().names
+    percentiles = category_percentiles(load_columns(*period_bounds(period)))
+    ranked = sorted(percentiles.items(), key=lambda kv: kv[1][1], reverse=True)
+    return {
+        "periods": periods,
+        "totals": from_cents(totals).tolist(),
+        "scheduled": [from_cents(cents) for cents in scheduled],
+        "rolling": from_cents(rolling_average(totals)).tolist(),
+        "categories": [names.get(cat_id, "Uncategorized") for cat_id, _ in ranked],
+        "p50": [from_cents(float(p[0])) for _, p in ranked],
+        "p90": [from_cents(float(p[1])) for _, p in ranked],
+    }
+
+
+def fingerprint(data, formats):
+    payload = json.dumps([REPORT_VERSION, sorted(formats), data], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _read_fingerprint(directory):
+    try:
+        with open(os.path.join(directory, FINGERPRINT_FILE), encoding="utf-8") as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+# -----------------------------
+# RENDERING
+# -----------------------------
+# Runs in render processes: only data in, files out. Figures are built
+# with the object-oriented API on an Agg canvas (no pyplot, no GUI
+# backend), so nothing here needs a display.
+def _write_atomic(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _render_chart(chart, data, path, fmt):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(7, 5), dpi=DPI)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    cats = [name for name, _ in data["categories"]]
+    vals = [from_cents(total) for _, total in data["categories"]]
+
+    if chart in ("pie", "bars") and not cats:
+        ax.set_axis_off()
+        ax.set_title("No expenses")
+    elif chart == "pie":
+        draw_category_pie(ax, cats, vals)
+    elif chart == "bars":
+        draw_category_bars(ax, cats, vals)
+    elif chart == "trend":
+        draw_monthly_trend(ax, data["trends"])
+    else:
+        draw_percentiles(ax, data["trends"])
+
+    fig.tight_layout()
+    _write_atomic(path, lambda tmp: fig.savefig(tmp, format=fmt))
+
+
+def _summary_html(data, formats):
+    s = data["summary"]
+    rows = [
+        ("Spent", format_money(s["spent"])),
+        ("Scheduled", format_money(s["scheduled"])),
+        ("Projected", format_money(s["projected"])),
+        ("Remaining", format_money(s["remaining"])),
+        ("Savings %", f"{s['savings_percent']:.1f}%"),
+        ("Weekly allowance", format_money(s["weekly_allowance"])),
+    ]
+    warnings = [text for flag, text in (
+        ("overspending", "Overspending!"),
+        ("projected_overspending", "On track to overspend this month"),
+        ("negative_cash", "Negative cash balance!"),
+    ) if s[flag]]
+
+    period = html.escape(data["period"])
+    image = formats[0]
+    parts = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8">',
+        f"<title>Budget-er report {period}</title>",
+        "<style>body{font-family:Arial,sans-serif;margin:2em}"
+        "table{border-collapse:collapse}td,th{padding:4px 12px;text-align:left}"
+        "td.num{text-align:right}.warning{color:#cc0000}img{max-width:48%}</style>",
+        f"</head><body><h1>Budget-er report {period}</h1>",
+        "<h2>Summary</h2><table>",
+    ]
+    parts += [f'<tr><th>{label}</th><td class="num">{value}</td></tr>' for label, value in rows]
+    parts.append("</table>")
+    parts += [f'<p class="warning">{html.escape(text)}</p>' for text in warnings]
+
+    parts.append("<h2>Charts</h2>")
+    parts += [f'<img src="{chart}.{image}" alt="{chart} chart">' for chart in CHARTS]
+
+    parts.append("<h2>By category</h2><table><tr><th>Category</th><th>Total</th></tr>")
+    parts += [f'<tr><td>{html.escape(name)}</td><td class="num">{format_money(total)}</td></tr>'
+              for name, total in data["categories"]]
+    parts.append("</table></body></html>")
+    return "\n".join(parts)
+
+
+def render_period(data, directory, formats=("png",), digest=None):
+    """
+    Write one period's charts (one file per chart and format) and its
+    index.html into directory. The fingerprint is written last, so an
+    interrupted render is redone next time.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for chart in CHARTS:
+        for fmt in formats:
+            _render_chart(chart, data, os.path.join(directory, f"{chart}.{fmt}"), fmt)
+
+    _write_atomic(os.path.join(directory, "index.html"),
+                  _writer(_summary_html(data, formats)))
+    _write_atomic(os.path.join(directory, FINGERPRINT_FILE),
+                  _writer(digest or fingerprint(data, formats)))
+    return directory
+
+
+def _writer(text):
+    def write(path):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+    return write
+
+
+def _render_job(job):
+    return render_period(*job)
+
+
+# -----------------------------
+# REPORT SETS
+# -----------------------------
+@profiled("report.render_reports")
+def render_reports(periods, out_dir, formats=("png",), jobs=None, force=False):
+    """
+    Render reports for periods into out_dir/<period>/, plus an index.html
+    linking them. Data is read here; periods whose fingerprint changed (or
+    all, with force) are rendered by up to jobs processes (default one per
+    CPU; 1 renders inline). Returns {"rendered": [...], "cached": [...]}.
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown or not formats:
+        raise ValueError(f"formats must be among {', '.join(FORMATS)}")
+
+    todo, cached = [], []
+    for period in sorted(set(periods)):
+        data = report_data(period)
+        directory = os.path.join(out_dir, period)
+        digest = fingerprint(data, formats)
+        if not force and _read_fingerprint(directory) == digest:
+            cached.append(period)
+        else:
+            todo.append((data, directory, tuple(formats), digest))
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(todo)))
+    if jobs == 1:
+        for job in todo:
+            _render_job(job)
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # "spawn" for the same reasons as budget_db's bulk import.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(jobs, mp_context=context) as pool:
+            list(pool.map(_render_job, todo))
+
+    os.makedirs(out_dir, exist_ok=True)
+    links = "\n".join(f'<li><a href="{html.escape(p)}/index.html">{html.escape(p)}</a></li>'
+                      for p in sorted(_finished_periods(out_dir), reverse=True))
+    _write_atomic(os.path.join(out_dir, "index.html"), _writer(
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Budget-er reports</title>'
+        f"</head><body><h1>Budget-er reports</h1><ul>\n{links}\n</ul></body></html>"))
+
+    return {"rendered": [job[0]["period"] for job in todo], "cached": cached}
+
+
+def _finished_periods(out_dir):
+    """Periods that have a finished report in out_dir."""
+    return [name for name in os.listdir(out_dir)
+            if os.path.isfile(os.path.join(out_dir, name, FINGERPRINT_FILE))]
+
+
+# -----------------------------
+# COMMAND LINE
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render Budget-er reports without a display.")
+    parser.add_argument("--db", default=budget_db.DB_NAME, help="database file")
+    parser.add_argument("--out", default="reports", help="output directory")
+    parser.add_argument("--period", action="append", default=[], metavar="YYYY-MM",
+                        help="period to report (repeatable; default: this month)")
+    parser.add_argument("--all", action="store_true", help="every period with data")
+    parser.add_argument("--format", default="png", help="comma-separated: png, svg")
+    parser.add_argument("--jobs", type=int, default=None, help="render processes")
+    parser.add_argument("--force", action="store_true", help="re-render unchanged periods")
+    args = parser.parse_args(argv)
+
+    budget_db.DB_NAME = args.db
+    budget_db.create_tables()
+    try:
+        periods = list(args.period)
+        if args.all:
+            periods += budget_db.get_periods()
+        periods = periods or [current_period()]
+        formats = tuple(f.strip() for f in args.format.split(",") if f.strip())
+
+        result = render_reports(periods, args.out, formats, args.jobs, args.force)
+    finally:
+        budget_db.close_connections()
+
+    print(f"rendered {len(result['rendered'])}, unchanged {len(result['cached'])} "
+          f"-> {os.path.join(args.out, 'index.html')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import tkinter as tk
+from tkinter import ttk
+
+# -----------------------------
+# THEME ENGINE
+# -----------------------------
+# Every window is built from ttk widgets, so their colours come from the
+# active ttk theme rather than from per-widget options. Light and dark are
+# two named ttk themes; switching is one Style.theme_use() call, and Tk
+# then restyles the whole widget tree itself, however many windows and
+# rows are open.
+#
+# The few classic Tk widgets left (the root and Toplevel backgrounds, the
+# Expense Manager's scroll Canvas, Text, Menu and the Combobox dropdown
+# list) take their defaults from the option database, and the existing
+# ones are recoloured from a class binding on <<ThemeChanged>>, which Tk
+# sends to every widget when the theme changes.
+LIGHT_THEME = {
+    "bg": "#ffffff",
+    "fg": "#000000",
+    "entry_bg": "#f0f0f0",
+    "button_bg": "#e0e0e0",
+    "button_active": "#d0d0d0",
+    "border": "#c8c8c8",
+    "select_bg": "#4a6984",
+    "select_fg": "#ffffff",
+    "danger": "#cc0000",
+}
+
+DARK_THEME = {
+    "bg": "#1e1e1e",
+    "fg": "#ffffff",
+    "entry_bg": "#2e2e2e",
+    "button_bg": "#3e3e3e",
+    "button_active": "#505050",
+    "border": "#3a3a3a",
+    "select_bg": "#3d6a99",
+    "select_fg": "#ffffff",
+    "danger": "#ff6b6b",
+}
+
+THEMES = {"light": LIGHT_THEME, "dark": DARK_THEME}
+THEME_PREFIX = "budgeter-"
+
+_current = "light"
+
+# Classic widget classes recoloured on <<ThemeChanged>>.
+_CLASSIC_CLASSES = ("Tk", "Toplevel", "Canvas", "Text")
+
+
+def _style_settings(p):
+    """ttk.Style.theme_create() settings for palette p. Named styles used by
+    the app: Header.TLabel, Period.TLabel, Warning.TLabel, Flat.TButton and
+    Danger.TButton."""
+    return {
+        ".": {
+            "configure": {
+                "background": p["bg"],
+                "foreground": p["fg"],
+                "fieldbackground": p["entry_bg"],
+                "troughcolor": p["bg"],
+                "bordercolor": p["border"],
+                "lightcolor": p["bg"],
+                "darkcolor": p["bg"],
+                "selectbackground": p["select_bg"],
+                "selectforeground": p["select_fg"],
+                "insertcolor": p["fg"],
+                "arrowcolor": p["fg"],
+            },
+        },
+        "TButton": {
+            "configure": {"background": p["button_bg"], "padding": (8, 3)},
+            "map": {"background": [("pressed", p["button_active"]),
+                                   ("active", p["button_active"])]},
+        },
+        "Flat.TButton": {
+            "configure": {"background": p["bg"], "relief": "flat", "borderwidth": 0,
+                          "padding": (4, 2), "anchor": "w"},
+            "map": {"background": [("active", p["button_bg"])]},
+        },
+        "Danger.TButton": {
+            "configure": {"foreground": p["danger"]},
+        },
+        "TEntry": {
+            "configure": {"fieldbackground": p["entry_bg"], "foreground": p["fg"]},
+        },
+        "TCombobox": {
+            "configure": {"fieldbackground": p["entry_bg"], "background": p["button_bg"]},
+            "map": {
+                "fieldbackground": [("readonly", p["entry_bg"])],
+                "foreground": [("readonly", p["fg"])],
+                "selectbackground": [("readonly", p["entry_bg"])],
+                "selectforeground": [("readonly", p["fg"])],
+            },
+        },
+        "Treeview": {
+            "configure": {"background": p["entry_bg"], "fieldbackground": p["entry_bg"],
+                          "foreground": p["fg"]},
+            "map": {"background": [("selected", p["select_bg"])],
+                    "foreground": [("selected", p["select_fg"])]},
+        },
+        "Treeview.Heading": {
+            "configure": {"background": p["button_bg"], "foreground": p["fg"]},
+            "map": {"background": [("active", p["button_active"])]},
+        },
+        "TScrollbar": {
+            "configure": {"background": p["button_bg"]},
+            "map": {"background": [("active", p["button_active"])]},
+        },
+        "TLabelframe": {
+            "configure": {"background": p["bg"], "bordercolor": p["border"]},
+        },
+        "TLabelframe.Label": {
+            "configure": {"background": p["bg"], "foreground": p["fg"]},
+        },
+        "Header.TLabel": {
+            "configure": {"font": ("Arial", 18, "bold"), "padding": (15, 8)},
+        },
+        "Period.TLabel": {
+            "configure": {"font": ("Arial", 12, "bold"), "anchor": "center"},
+        },
+        "Warning.TLabel": {
+            "configure": {"foreground": p["danger"]},
+        },
+    }
+
+
+def init_theme(root, name="light"):
+    """Register the themes and class bindings once per Tk root, then apply name."""
+    style = ttk.Style(root)
+    parent = "clam" if "clam" in style.theme_names() else style.theme_use()
+    for theme, palette in THEMES.items():
+        if THEME_PREFIX + theme not in style.theme_names():
+            style.theme_create(THEME_PREFIX + theme, parent=parent,
+                               settings=_style_settings(palette))
+
+    for cls in _CLASSIC_CLASSES:
+        root.bind_class(cls, "<<ThemeChanged>>", _recolor, add="+")
+
+    use_theme(root, name)
+
+
+def use_theme(root, name):
+    """Switch every window to theme name ("light" or "dark")."""
+    global _current
+    _current = name
+    p = THEMES[name]
+
+    # Defaults for classic widgets created from now on
+    for pattern, value in (
+        ("*Toplevel.background", p["bg"]),
+        ("*Canvas.background", p["bg"]),
+        ("*Canvas.highlightThickness", 0),
+        ("*Text.background", p["entry_bg"]),
+        ("*Text.foreground", p["fg"]),
+        ("*Text.insertBackground", p["fg"]),
+        ("*Menu.background", p["button_bg"]),
+        ("*Menu.foreground", p["fg"]),
+        ("*Menu.activeBackground", p["select_bg"]),
+        ("*Menu.activeForeground", p["select_fg"]),
+        ("*TCombobox*Listbox.background", p["entry_bg"]),
+        ("*TCombobox*Listbox.foreground", p["fg"]),
+        ("*TCombobox*Listbox.selectBackground", p["select_bg"]),
+        ("*TCombobox*Listbox.selectForeground", p["select_fg"]),
+    ):
+        root.option_add(pattern, value)
+
+    root.configure(background=p["bg"])
+    ttk.Style(root).theme_use(THEME_PREFIX + name)
+
+
+def toggle_theme(root):
+    use_theme(root, "dark" if _current == "light" else "light")
+
+
+def current_palette():
+    return THEMES[_current]
+
+
+def _recolor(event):
+    widget = event.widget
+    if not isinstance(widget, tk.Misc):
+        return
+    p = THEMES[_current]
+    if widget.winfo_class() == "Text":
+        widget.configure(background=p["entry_bg"], foreground=p["fg"],
+                         insertbackground=p["fg"])
+    else:
+        widget.configure(background=p["bg"])
@@ -0,0 +1,100 @@
+import calendar
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# -----------------------------
+# STORAGE UNITS
+# -----------------------------
+# The database stores money as integer cents and times as integer seconds
+# since 1970-01-01 00:00 of the wall clock the user typed (no time zone),
+# so totals are exact and rows and indexes stay small. Everything above
+# budget_db converts through these helpers at the edges: text the user
+# typed or a CSV holds on the way in, labels and CSV text on the way out.
+CENTS = 100
+EPOCH = datetime(1970, 1, 1)
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Non-ISO dates accepted on the way in (bank CSV exports, rows typed into
+# pre-6 databases), each optionally followed by " HH:MM[:SS]". Tried in
+# order, so an ambiguous "01/02/2024" reads month first.
+DATE_INPUT_FORMATS = ("%m/%d/%Y", "%d/%m/%Y", "%m/%d/%y", "%d.%m.%Y", "%Y/%m/%d",
+                      "%d %b %Y", "%b %d %Y", "%b %d, %Y")
+_TIME_SUFFIXES = ("", " %H:%M", " %H:%M:%S")
+
+
+def to_cents(value):
+    """
+    Parse an amount ("12.34", "$1,200", 12.34, Decimal) into integer cents,
+    rounding half up. Raises ValueError for anything that is not a number.
+    """
+    if isinstance(value, str):
+        value = value.strip().replace(",", "").replace("$", "")
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"invalid amount {value!r}") from None
+    if not amount.is_finite():
+        raise ValueError(f"invalid amount {value!r}")
+    return int((amount * CENTS).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_amount(cents):
+    """Integer cents as plain decimal text: -1234 -> "-12.34"."""
+    sign = "-" if cents < 0 else ""
+    whole, frac = divmod(abs(int(cents)), CENTS)
+    return f"{sign}{whole}.{frac:02d}"
+
+
+def format_money(cents):
+    """Integer cents for a label: -1234 -> "-$12.34"."""
+    text = format_amount(cents)
+    return "-$" + text[1:] if text.startswith("-") else "$" + text
+
+
+def from_cents(cents):
+    """Cents as a float number of units, for charts and other display math."""
+    return cents / CENTS
+
+
+def to_timestamp(value):
+    """
+    Seconds since the epoch for a datetime, date or date text: ISO
+    ("YYYY-MM-DD", "YYYY-MM-DD HH:MM[:SS]", "YYYY-MM-DDTHH:MM:SS") or one
+    of DATE_INPUT_FORMATS. The wall-clock fields are stored as written.
+    Raises ValueError for text that is not a date.
+    """
+    if isinstance(value, str):
+        value = _parse_date(value)
+    if isinstance(value, datetime):
+        return calendar.timegm(value.replace(tzinfo=None).timetuple())
+    if isinstance(value, date):
+        return calendar.timegm(value.timetuple())
+    raise TypeError(f"cannot convert {type(value).__name__} to a timestamp")
+
+
+def _parse_date(text):
+    text = text.strip()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in DATE_INPUT_FORMATS:
+        for suffix in _TIME_SUFFIXES:
+            try:
+                return datetime.strptime(text, fmt + suffix)
+            except ValueError:
+                pass
+    raise ValueError(f"invalid date {text!r}")
+
+
+def from_timestamp(ts):
+    """The naive datetime a stored timestamp stands for."""
+    return EPOCH + timedelta(seconds=ts)
+
+
+def format_timestamp(ts, fmt=DATE_FORMAT):
+    return from_timestamp(ts).strftime(fmt)
+
+
+def now_timestamp():
+    return to_timestamp(datetime.now().replace(microsecond=0))
@@ -0,0 +1,197 @@
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# -----------------------------
+# BACKGROUND DB WORKER
+# -----------------------------
+# Tk is single-threaded: anything slow inside a callback freezes the
+# window. DBWorker runs budget_db calls on background threads instead.
+# Writes go to a single writer thread, so they stay in submission order
+# and SQLite only ever sees one writer from this process. Reads run on a
+# small pool. Each thread gets its own connection from budget_db.connect().
+#
+# Results never touch Tk from a worker thread: they are queued and the
+# Tk thread picks them up with root.after().
+POLL_MS = 25
+
+
+class Job:
+    """Handle for a submitted call. cancel() drops its result (and lets
+    long-running calls that check .cancelled stop early)."""
+
+    def __init__(self, fn, args, kwargs, on_done, on_error, owner, key, is_write):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.on_error = on_error
+        self.owner = owner
+        self.key = key
+        self.is_write = is_write
+        self.started = False
+        self.finished = False
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+class DBWorker:
+    def __init__(self, root, readers=2):
+        self.root = root
+        self._results = queue.Queue()
+        self._writes = queue.Queue()
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-read")
+        self._pending = {}   # key -> queued, not yet started Job
+        self._jobs = set()   # submitted and not yet delivered
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._polling = False
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._write_loop, name="db-write", daemon=True)
+        self._writer.start()
+
+    # -------------------------
+    # Submitting work
+    # -------------------------
+    def read(self, fn, *args, on_done=None, on_error=None, owner=None, key=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on a reader thread.
+
+        If key is given and a job with the same key is still queued, the
+        two are coalesced: the queued job is reused and takes the newer
+        callbacks, so a burst of identical refreshes costs one query.
+        """
+        return self._submit(self._readers.submit, fn, args, kwargs, on_done, on_error, owner, key)
+
+    def write(self, fn, *args, on_done=None, on_error=None, owner=None, key=None, **kwargs):
+        """Run fn(*args, **kwargs) on the writer thread, after earlier writes."""
+        return self._submit(self._enqueue_write, fn, args, kwargs, on_done, on_error, owner, key)
+
+    def post(self, fn, *args):
+        """Call fn(*args) on the Tk thread. Safe to use from any thread."""
+        self._results.put((None, fn, args, None))
+        self._ensure_polling()
+
+    def _submit(self, dispatch, fn, args, kwargs, on_done, on_error, owner, key):
+        if self._closed:
+            raise RuntimeError("DBWorker is shut down")
+
+        with self._lock:
+            if key is not None:
+                queued = self._pending.get(key)
+                if queued is not None and not queued.started and not queued.cancelled:
+                    queued.args, queued.kwargs = args, kwargs
+                    queued.on_done, queued.on_error, queued.owner = on_done, on_error, owner
+                    return queued
+
+            job = Job(fn, args, kwargs, on_done, on_error, owner, key,
+                      is_write=dispatch == self._enqueue_write)
+            if key is not None:
+                self._pending[key] = job
+            self._jobs.add(job)
+            self._outstanding += 1
+
+        dispatch(self._run, job)
+        self._ensure_polling()
+        return job
+
+    def _enqueue_write(self, run, job):
+        self._writes.put(job)
+
+    # -------------------------
+    # Worker threads
+    # -------------------------
+    def _write_loop(self):
+        while True:
+            job = self._writes.get()
+            if job is None:
+                return
+            self._run(job)
+
+    def _run(self, job):
+        with self._lock:
+            job.started = True
+            if job.key is not None and self._pending.get(job.key) is job:
+                del self._pending[job.key]
+
+        if job.cancelled:
+            self._results.put((job, None, (), None))
+            return
+
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+        except Exception as exc:
+            self._results.put((job, job.on_error, (exc,), exc))
+        else:
+            self._results.put((job, job.on_done, (result,), None))
+
+    # -------------------------
+    # Delivery on the Tk thread
+    # -------------------------
+    def _ensure_polling(self):
+        # root.after is only called from the Tk thread; worker threads just
+        # queue results and rely on the poll already being scheduled.
+        if threading.current_thread() is not threading.main_thread():
+            return
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._poll)
+
+    def _poll(self):
+        while True:
+            try:
+                job, callback, args, error = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if job is not None:
+                job.finished = True
+                with self._lock:
+                    self._outstanding -= 1
+                    self._jobs.discard(job)
+                if job.cancelled:
+                    continue
+                if job.owner is not None and not job.owner.winfo_exists():
+                    continue  # window closed while the job ran
+                if error is not None and callback is None:
+                    self.root.report_callback_exception(type(error), error, error.__traceback__)
+                    continue
+
+            if callback is not None:
+                try:
+                    callback(*args)
+                except Exception:
+                    self.root.report_callback_exception(*sys.exc_info())
+
+        with self._lock:
+            busy = self._outstanding > 0
+        if busy or not self._results.empty():
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    # -------------------------
+    # Shutdown
+    # -------------------------
+    def shutdown(self):
+        """
+        Cancel pending reads and the write in progress, let queued writes
+        finish, then stop the threads. Calls that poll job.cancelled (like
+        a CSV import's progress callback) stop at their next check.
+        """
+        self._closed = True
+        with self._lock:
+            for job in self._jobs:
+                if not job.is_write or job.started:
+                    job.cancel()
+        self._writes.put(None)
+        self._writer.join()
+        self._readers.shutdown(wait=True, cancel_futures=True)
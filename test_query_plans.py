@@ -0,0 +1,48 @@
+"""
+Query plan regression checks: each of budget_db.HOT_QUERIES must be
+served by the index it was written for, without a temp B-tree sort.
+
+    python -m pytest test_query_plans.py
+"""
+import pytest
+
+import budget_db
+
+# Hot query -> the index its plan must use.
+EXPECTED_INDEX = {
+    "get_expenses": "idx_expenses_date",
+    "category_totals": "category_totals",
+    "expense_columns": "idx_expenses_date",
+    "category_page": "idx_expenses_category_date",
+}
+
+# category_totals groups and orders one rollup row per category, so its
+# sort is over a handful of rows, never over expenses.
+MAY_SORT = {"category_totals"}
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(budget_db, "DB_NAME", str(tmp_path / "budget.db"))
+    budget_db.create_tables()
+    for name in ("Food", "Rent", "Transport"):
+        budget_db.add_category(name)
+    ids = [budget_db.category_id(name) for name in ("Food", "Rent", "Transport")]
+    with budget_db.transaction():
+        for i in range(500):
+            budget_db.add_expense(100 + i, ids[i % 3], 1_700_000_000 + i * 3600)
+    budget_db.connect().execute("ANALYZE")
+    yield
+    budget_db.close_connections()
+
+
+def test_every_hot_query_has_an_expectation():
+    assert set(EXPECTED_INDEX) == set(budget_db.HOT_QUERIES)
+
+
+@pytest.mark.parametrize("name", sorted(budget_db.HOT_QUERIES))
+def test_hot_query_plan(database, name):
+    plan = budget_db.query_plans()[name]
+    assert any(EXPECTED_INDEX[name] in line for line in plan), plan
+    if name not in MAY_SORT:
+        assert not any("USE TEMP B-TREE" in line for line in plan), plan
@@ -0,0 +1,104 @@
+"""
+Revision counting when another process writes: the refresh scheduler
+must never take a write by someone else for the app's own.
+
+    python -m pytest test_revision.py
+"""
+import queue
+import sqlite3
+import threading
+
+import pytest
+
+import budget_db
+from budget_refresh import RefreshScheduler, tracked
+
+
+class Thread:
+    """A thread that keeps its own budget_db connection, like a DBWorker thread."""
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while (job := self._jobs.get()) is not None:
+            fn, done = job
+            done.put(fn())
+
+    def run(self, fn):
+        done = queue.Queue()
+        self._jobs.put((fn, done))
+        return done.get(timeout=10)
+
+    def stop(self):
+        self._jobs.put(None)
+        self._thread.join()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = str(tmp_path / "budget.db")
+    monkeypatch.setattr(budget_db, "DB_NAME", path)
+    budget_db.create_tables()
+    budget_db.add_category("Food")
+    writer, readers = Thread(), [Thread(), Thread()]
+    other = sqlite3.connect(path)  # another process, as far as budget_db can tell
+    yield writer, readers, other
+    other.close()
+    for thread in (writer, *readers):
+        thread.stop()
+    budget_db.close_connections()
+
+
+def insert_elsewhere(other):
+    other.execute(
+        "INSERT INTO expenses (amount_cents, category_id, ts) VALUES (500, NULL, 1700000000)"
+    )
+    other.commit()
+
+
+def test_outside_write_before_local_write_is_not_advanced_over(database):
+    writer, readers, other = database
+    category = budget_db.category_id("Food")
+    writer.run(budget_db.get_revision)
+    shown = readers[0].run(budget_db.get_revision)
+    scheduler = RefreshScheduler(None, None, poll_ms=0)
+    scheduler.subscribe("expenses", lambda revision: None, revision=shown)
+
+    insert_elsewhere(other)
+    _, before, after = writer.run(lambda: tracked(budget_db.add_expense, 1200, category, 1700003600))
+    assert before == shown
+    assert after == before + 2
+
+    scheduler.advance("expenses", before, after)
+    assert scheduler._views["expenses"][2] == shown  # still stale, so it reloads
+    assert readers[0].run(budget_db.get_revision) == after
+
+
+def test_local_write_alone_is_advanced_over(database):
+    writer, readers, _ = database
+    category = budget_db.category_id("Food")
+    writer.run(budget_db.get_revision)
+    shown = readers[0].run(budget_db.get_revision)
+
+    _, before, after = writer.run(lambda: tracked(budget_db.add_expense, 1200, category, 1700003600))
+    assert (before, after) == (shown, shown + 1)
+    assert [reader.run(budget_db.get_revision) for reader in readers] == [after, after]
+
+
+def test_outside_write_counts_once_for_all_connections(database):
+    writer, readers, other = database
+    for thread in (writer, *readers):
+        thread.run(budget_db.get_revision)
+    start = budget_db.current_revision()
+
+    insert_elsewhere(other)
+    seen = [reader.run(budget_db.get_revision) for reader in readers]
+    assert seen == [start + 1, start + 1]
+    assert writer.run(budget_db.get_revision) == start + 1
+
+    insert_elsewhere(other)
+    assert readers[1].run(budget_db.get_revision) == start + 2
+    assert readers[0].run(budget_db.get_revision) == start + 2